@@ -0,0 +1,58 @@
+import sys
+sys.path.append('..')
+import os
+import time
+import tempfile
+import numpy as np
+from common.util import SimilarityIndex
+from common.ann import IVFIndex
+
+# 10万語の単語ベクトルで、厳密な検索（SimilarityIndex）とIVFの近似検索の
+# recall@k（厳密な上位k語のうち見つかった割合）とQPS（1クエリずつ検索した場合）を比べる。
+# 単語ベクトルは、意味の近い単語がまとまる（クラスタになる）ように作った乱数
+
+vocab_size = 100000
+wordvec_size = 100
+top = 10
+rng = np.random.default_rng(0)
+centers = rng.standard_normal((2000, wordvec_size))
+word_vecs = (centers[rng.integers(0, len(centers), vocab_size)] +
+             0.7 * rng.standard_normal((vocab_size, wordvec_size))).astype(np.float32)
+id_to_word = {i: 'w%d' % i for i in range(vocab_size)}
+word_to_id = {w: i for i, w in id_to_word.items()}
+queries = rng.choice(vocab_size, size=200, replace=False)
+
+exact = SimilarityIndex(word_vecs, word_to_id, id_to_word)
+start = time.perf_counter()
+for q in queries:
+    exact.search([q], top)
+exact_qps = len(queries) / (time.perf_counter() - start)
+expected, _ = exact.search(queries, top)
+
+start = time.perf_counter()
+index = IVFIndex(word_vecs, word_to_id, id_to_word, random_state=0)
+build = time.perf_counter() - start
+print('vocab={} dim={} lists={} build={:.1f}s'.format(
+    vocab_size, wordvec_size, len(index.centroids), build))
+
+print('{:>8} {:>10} {:>10} {:>8}'.format('n_probe', 'recall@%d' % top, 'QPS', 'speedup'))
+print('{:>8} {:>10.3f} {:>10.0f} {:>8}'.format('exact', 1.0, exact_qps, '1.0x'))
+for n_probe in [1, 2, 4, 8, 16, 32, 64]:
+    start = time.perf_counter()
+    for q in queries:
+        index.search([q], top, n_probe)
+    qps = len(queries) / (time.perf_counter() - start)
+    ids, _ = index.search(queries, top, n_probe)
+    recall = np.mean([len(set(a) & set(b)) / top for a, b in zip(ids, expected)])
+    print('{:>8} {:>10.3f} {:>10.0f} {:>7.1f}x'.format(n_probe, recall, qps, qps / exact_qps))
+
+# 保存して読み込んだインデックスでも同じ結果になること
+path = os.path.join(tempfile.mkdtemp(), 'ivf.npz')
+start = time.perf_counter()
+index.save(path)
+loaded = IVFIndex.load(path)
+print('save + load: {:.2f}s  {:.0f}MB  same: {}'.format(
+    time.perf_counter() - start, os.path.getsize(path) / 2**20,
+    np.array_equal(loaded.search(queries, top)[0], index.search(queries, top)[0])))
+print(loaded.most_similar('w1', top=3))
+os.remove(path)
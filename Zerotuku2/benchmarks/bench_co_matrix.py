@@ -0,0 +1,64 @@
+import sys
+sys.path.append('..')
+import time
+import numpy as np
+from common.util import create_co_matrix
+
+# 共起行列の作成：単語ごとのPythonループ（元の実装）とベクトル化した実装の比較
+
+
+def create_co_matrix_loop(corpus, vocab_size, window_size=1):
+    corpus_size = len(corpus)
+    co_matrix = np.zeros((vocab_size, vocab_size), dtype=np.int32)
+
+    for idx, word_id in enumerate(corpus):
+        for i in range(1, window_size + 1):
+            left_idx = idx - i
+            right_idx = idx + i
+
+            if left_idx >= 0:
+                left_word_id = corpus[left_idx]
+                co_matrix[word_id, left_word_id] += 1
+
+            if right_idx < corpus_size:
+                right_word_id = corpus[right_idx]
+                co_matrix[word_id, right_word_id] += 1
+
+    return co_matrix
+
+
+def make_corpus(corpus_size, vocab_size, seed=0):
+    # 単語の出現頻度がZipf則にしたがうコーパス（PTBに近い）
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    return rng.choice(vocab_size, size=corpus_size, p=p / p.sum()).astype(np.int32)
+
+
+vocab_size = 10000  # PTBの語彙数
+print('{:>10} {:>7} {:>10} {:>12} {:>9} {:>6}'.format(
+    'corpus', 'window', 'loop[s]', 'vector[s]', 'speedup', 'same'))
+for corpus_size in [10000, 100000, 929589]:  # 929589: PTB（train）の単語数
+    corpus = make_corpus(corpus_size, vocab_size)
+    for window_size in [1, 2, 5]:
+        start = time.perf_counter()
+        C = create_co_matrix(corpus, vocab_size, window_size)
+        vector = time.perf_counter() - start
+
+        if corpus_size <= 100000:
+            start = time.perf_counter()
+            expected = create_co_matrix_loop(corpus, vocab_size, window_size)
+            loop = time.perf_counter() - start
+            print('{:>10} {:>7} {:>10.2f} {:>12.3f} {:>8.1f}x {:>6}'.format(
+                corpus_size, window_size, loop, vector, loop / vector,
+                str(np.array_equal(C, expected))))
+        else:
+            # ループは数十秒かかるので、ベクトル化した方だけ測る
+            print('{:>10} {:>7} {:>10} {:>12.3f} {:>9} {:>6}'.format(
+                corpus_size, window_size, '-', vector, '-', '-'))
+
+# 小さい語彙・短いコーパスでも同じ結果になること
+for text_size, window_size in [(0, 1), (1, 1), (3, 5), (50, 2)]:
+    corpus = make_corpus(text_size, 7, seed=text_size)
+    assert np.array_equal(create_co_matrix(corpus, 7, window_size),
+                          create_co_matrix_loop(corpus, 7, window_size))
+print('small corpora: same')
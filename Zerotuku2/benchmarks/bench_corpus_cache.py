@@ -0,0 +1,65 @@
+import sys
+sys.path.append('..')
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+import scipy.sparse  # importの時間を測らないように先に読み込む
+from common.util import preprocess_file, create_sparse_co_matrix, sparse_ppmi, randomized_svd
+from common.corpus_cache import cached_corpus, corpus_hash, cached
+
+# count_method_big.pyと同じ手順（コーパスの読み込み → 共起行列 → PPMI → SVD）を
+# キャッシュなし（1回目）とキャッシュあり（2回目）で比べる。
+# コーパスはPTB（train）と同じくらいの大きさのテキストファイルから作る
+
+window_size = 2
+wordvec_size = 100
+work_dir = tempfile.mkdtemp()
+text_path = os.path.join(work_dir, 'corpus.txt')
+cache_dir = os.path.join(work_dir, 'cache')
+
+rng = np.random.default_rng(0)
+vocab_size = 10000
+p = 1.0 / np.arange(1, vocab_size + 1)
+words = np.array(['word%d' % i for i in range(vocab_size)], dtype=object)
+with open(text_path, 'w') as f:
+    f.write(' '.join(words[rng.choice(vocab_size, size=929589, p=p / p.sum())].tolist()))
+
+
+def run():
+    times = {}
+    start = time.perf_counter()
+    corpus, word_to_id, id_to_word = cached_corpus(
+        'corpus', lambda: preprocess_file(text_path), cache_dir)
+    key = corpus_hash(corpus)
+    times['load'] = time.perf_counter() - start
+
+    def svd():
+        C = cached('co', (key, window_size), lambda: create_sparse_co_matrix(
+            corpus, len(word_to_id), window_size), cache_dir)
+        W = cached('ppmi', (key, window_size), lambda: sparse_ppmi(C), cache_dir)
+        U, S, V = randomized_svd(W, wordvec_size, random_state=0)
+        return U[:, :wordvec_size]
+
+    start = time.perf_counter()
+    word_vecs = cached('svd', (key, window_size, wordvec_size), svd, cache_dir)
+    times['vectors'] = time.perf_counter() - start
+    return corpus, word_to_id, word_vecs, times
+
+
+corpus, word_to_id, word_vecs, cold = run()
+corpus2, word_to_id2, word_vecs2, warm = run()
+same = np.array_equal(corpus, corpus2) and word_to_id == word_to_id2 and \
+    np.array_equal(word_vecs, word_vecs2)
+
+print('corpus={} vocab={} window={} wordvec={}'.format(
+    len(corpus), len(word_to_id), window_size, wordvec_size))
+print('{:>8} {:>12} {:>12} {:>10}'.format('', 'load[ms]', 'vectors[ms]', 'total[ms]'))
+for name, t in [('cold', cold), ('warm', warm)]:
+    print('{:>8} {:>12.1f} {:>12.1f} {:>10.1f}'.format(
+        name, t['load'] * 1e3, t['vectors'] * 1e3, (t['load'] + t['vectors']) * 1e3))
+print('same result: {}  corpus type: {}'.format(same, type(corpus2).__name__))
+for name in sorted(os.listdir(cache_dir)):
+    print('  {:<40} {:>8.1f}MB'.format(name, os.path.getsize(os.path.join(cache_dir, name)) / 2**20))
+shutil.rmtree(work_dir)
@@ -0,0 +1,67 @@
+import sys
+sys.path.append('..')
+import time
+import numpy as np
+from common.util import cos_similarity, create_sparse_co_matrix, sparse_ppmi, randomized_svd, \
+    SimilarityIndex
+
+# 類似単語の検索：単語ごとにcos_similarityを呼ぶループ（元のmost_similar）と
+# SimilarityIndex（1回の行列積 + argpartition）の比較
+
+
+def most_similar_loop(query_id, word_matrix, top=5):
+    query_vec = word_matrix[query_id]
+    vocab_size = len(word_matrix)
+    similarity = np.zeros(vocab_size)
+    for i in range(vocab_size):
+        similarity[i] = cos_similarity(word_matrix[i], query_vec)
+
+    result = []
+    for i in (-1 * similarity).argsort():
+        if i == query_id:
+            continue
+        result.append((i, similarity[i]))
+        if len(result) >= top:
+            return result
+
+
+# PTBと同じ大きさのコーパスから、count_method_big.pyと同じ手順で単語ベクトルを作る
+vocab_size = 10000
+wordvec_size = 100
+rng = np.random.default_rng(0)
+p = 1.0 / np.arange(1, vocab_size + 1)
+corpus = rng.choice(vocab_size, size=929589, p=p / p.sum())
+W = sparse_ppmi(create_sparse_co_matrix(corpus, vocab_size, window_size=2))
+U, S, V = randomized_svd(W, wordvec_size, random_state=0)
+word_vecs = U[:, :wordvec_size]
+id_to_word = {i: 'w%d' % i for i in range(vocab_size)}
+word_to_id = {w: i for i, w in id_to_word.items()}
+
+top = 5
+queries = rng.choice(vocab_size, size=200, replace=False)
+
+start = time.perf_counter()
+expected = [most_similar_loop(q, word_vecs, top) for q in queries[:20]]
+loop = (time.perf_counter() - start) / 20
+
+start = time.perf_counter()
+index = SimilarityIndex(word_vecs, word_to_id, id_to_word)
+build = time.perf_counter() - start
+
+start = time.perf_counter()
+single = [index.search([q], top) for q in queries]
+one = (time.perf_counter() - start) / len(queries)
+
+start = time.perf_counter()
+ids, sims = index.search(queries, top)
+batch = (time.perf_counter() - start) / len(queries)
+
+same = all([[i for i, s in e] == list(r) for e, r in zip(expected, ids)])
+close = all([np.allclose([s for i, s in e], r, atol=1e-6) for e, r in zip(expected, sims)])
+print('vocab={} dim={} top={}'.format(vocab_size, wordvec_size, top))
+print('{:>10} {:>14} {:>9}'.format('', 'per query[ms]', 'speedup'))
+print('{:>10} {:>14.3f} {:>9}'.format('loop', loop * 1e3, '1.0x'))
+print('{:>10} {:>14.3f} {:>8.0f}x'.format('single', one * 1e3, loop / one))
+print('{:>10} {:>14.3f} {:>8.0f}x'.format('batch', batch * 1e3, loop / batch))
+print('index build: {:.1f}ms  same ranking: {}  same similarity: {}'.format(build * 1e3, same, close))
+print(index.most_similar('w1', top=3))
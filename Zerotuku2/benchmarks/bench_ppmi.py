@@ -0,0 +1,76 @@
+import sys
+sys.path.append('..')
+import os
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+from common.util import create_co_matrix, ppmi
+
+# PPMI：セルごとのPythonループ（元の実装）と、行ごとにまとめてベクトル化した実装の比較
+
+
+def ppmi_loop(C, verbose=False, eps = 1e-8):
+    M = np.zeros_like(C, dtype=np.float32)
+    N = np.sum(C)
+    S = np.sum(C, axis=0)
+    total = C.shape[0] * C.shape[1]
+    cnt = 0
+
+    for i in range(C.shape[0]):
+        for j in range(C.shape[1]):
+            pmi = np.log2(C[i, j] * N / (S[j]*S[i]) + eps)
+            M[i, j] = max(0, pmi)
+
+            if verbose:
+                cnt += 1
+                if cnt % (total//100 + 1) == 0:
+                    print('%.1f%% done' % (100*cnt/total))
+    return M
+
+
+def make_co_matrix(vocab_size, corpus_size=929589, window_size=2, seed=0):
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    corpus = rng.choice(vocab_size, size=corpus_size, p=p / p.sum())
+    return create_co_matrix(corpus, vocab_size, window_size)
+
+
+print('{:>7} {:>10} {:>12} {:>9} {:>6}'.format('vocab', 'loop[s]', 'vector[s]', 'speedup', 'same'))
+for vocab_size in [300, 1000]:
+    C = make_co_matrix(vocab_size)
+    start = time.perf_counter()
+    expected = ppmi_loop(C)
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    W = ppmi(C)
+    vector = time.perf_counter() - start
+    print('{:>7} {:>10.2f} {:>12.4f} {:>8.0f}x {:>6}'.format(
+        vocab_size, loop, vector, loop / vector, str(np.array_equal(W, expected))))
+
+# PTBと同じ語彙数（ループだと1億回）。作業用の配列はchunk_sizeの行数分だけ
+vocab_size = 10000
+C = make_co_matrix(vocab_size)
+print()
+print('vocab={}  (result: {:.0f}MB)'.format(vocab_size, vocab_size ** 2 * 4 / 2**20))
+print('{:>22} {:>8} {:>14}'.format('', 'time[s]', 'peak extra[MB]'))
+for chunk_size in [100, 1000, vocab_size]:
+    W = np.empty(C.shape, dtype=np.float32)
+    tracemalloc.start()
+    start = time.perf_counter()
+    ppmi(C, out=W, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:>22} {:>8.2f} {:>14.0f}'.format('chunk_size=%d' % chunk_size, elapsed, peak / 2**20))
+
+# 結果をmemmap（ファイル）に書き出す
+path = os.path.join(tempfile.mkdtemp(), 'ppmi.dat')
+out = np.memmap(path, dtype=np.float32, mode='w+', shape=C.shape)
+start = time.perf_counter()
+ppmi(C, verbose=True, out=out, chunk_size=2500)
+out.flush()
+print('{:>22} {:>8.2f}  same={}'.format('memmap', time.perf_counter() - start,
+                                        np.array_equal(out, W)))
+del out
+os.remove(path)
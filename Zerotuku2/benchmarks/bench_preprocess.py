@@ -0,0 +1,66 @@
+import sys
+sys.path.append('..')
+import os
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+from common.util import preprocess, preprocess_file
+
+# テキスト全体を読み込むpreprocessと、ファイルを少しずつ読むpreprocess_fileの
+# スループット（tokens/sec）とピークメモリの比較
+
+
+def make_text_file(path, n_tokens, vocab_size=50000, seed=0):
+    # PTBのように1行1文（文末は' .'）で、単語の頻度はZipf則
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    words = np.array(['word%d' % i for i in range(vocab_size)])
+    with open(path, 'w') as f:
+        for start in range(0, n_tokens, 1000000):
+            ids = rng.choice(vocab_size, size=min(1000000, n_tokens - start), p=p / p.sum())
+            tokens = words[ids].astype(object)
+            tokens[19::20] = tokens[19::20] + '.\n'  # 20語ごとに文末
+            f.write(' '.join(tokens.tolist()) + ' ')
+
+
+def measure(f, *args, **kwargs):
+    # tracemallocを動かすと小さなオブジェクトの確保が遅くなるので、時間とメモリは別々に測る
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = f(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def read_and_preprocess(path):
+    with open(path) as f:
+        return preprocess(f.read())
+
+
+path = os.path.join(tempfile.mkdtemp(), 'corpus.txt')
+print('{:>10} {:>8} {:>16} {:>14} {:>10} {:>6}'.format(
+    'tokens', 'file[MB]', 'method', 'tokens/sec', 'peak[MB]', 'same'))
+for n_tokens in [1000000, 5000000]:
+    make_text_file(path, n_tokens)
+    size = os.path.getsize(path) / 2**20
+
+    (corpus, word_to_id, id_to_word), t0, m0 = measure(read_and_preprocess, path)
+    (scorpus, sword_to_id, sid_to_word), t1, m1 = measure(preprocess_file, path)
+    same = np.array_equal(corpus, scorpus) and word_to_id == sword_to_id
+    print('{:>10} {:>8.0f} {:>16} {:>14.0f} {:>10.0f} {:>6}'.format(
+        len(corpus), size, 'preprocess', len(corpus) / t0, m0, ''))
+    print('{:>10} {:>8.0f} {:>16} {:>14.0f} {:>10.0f} {:>6}'.format(
+        len(scorpus), size, 'preprocess_file', len(scorpus) / t1, m1, str(same)))
+    del corpus, word_to_id, id_to_word
+
+# 語彙の刈り込み（出現回数5回以上、上位1万語、それ以外は<unk>）
+(corpus, word_to_id, id_to_word), t, m = measure(
+    preprocess_file, path, min_count=5, max_vocab=10000, unk='<unk>')
+print('{:>10} {:>8.0f} {:>16} {:>14.0f} {:>10.0f}  vocab={}'.format(
+    len(corpus), size, 'pruned', len(corpus) / t, m, len(word_to_id)))
+os.remove(path)
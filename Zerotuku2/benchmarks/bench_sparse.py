@@ -0,0 +1,58 @@
+import sys
+sys.path.append('..')
+import time
+import tracemalloc
+import numpy as np
+import scipy.sparse  # importの時間を測らないように先に読み込む
+from common.util import create_co_matrix, ppmi, create_sparse_co_matrix, sparse_ppmi, randomized_svd
+
+# 共起行列 → PPMI → truncated SVD を、密行列と疎行列（CSR）で比べる（時間とピークメモリ）
+
+
+def make_corpus(corpus_size, vocab_size, seed=0):
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    return rng.choice(vocab_size, size=corpus_size, p=p / p.sum()).astype(np.int32)
+
+
+def measure(f, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+corpus_size = 929589  # PTB（train）の単語数
+window_size = 2
+wordvec_size = 100
+print('corpus={} window={} wordvec={}'.format(corpus_size, window_size, wordvec_size))
+print('{:>7} {:>7} {:>14} {:>14} {:>14} {:>6}'.format(
+    'vocab', 'path', 'co [s / MB]', 'ppmi [s / MB]', 'svd [s / MB]', 'nnz%'))
+
+
+def row(vocab_size, path, co, pm, sv, nnz):
+    cell = lambda m: '-' if m is None else '{:.2f} / {:.0f}'.format(m[1], m[2])
+    print('{:>7} {:>7} {:>14} {:>14} {:>14} {:>6}'.format(
+        vocab_size, path, cell(co), cell(pm), cell(sv), nnz))
+
+
+for vocab_size in [1000, 10000, 100000]:
+    corpus = make_corpus(corpus_size, vocab_size)
+
+    co = measure(create_sparse_co_matrix, corpus, vocab_size, window_size)
+    pm = measure(sparse_ppmi, co[0])
+    sv = measure(randomized_svd, pm[0], wordvec_size, random_state=0)
+    nnz = '{:.2f}'.format(100 * co[0].nnz / vocab_size ** 2)
+    row(vocab_size, 'sparse', co, pm, sv, nnz)
+
+    # 密行列は語彙数の2乗のメモリ（100kでは40GB）が必要なので小さい語彙だけ
+    if vocab_size <= 10000:
+        dco = measure(create_co_matrix, corpus, vocab_size, window_size)
+        assert np.array_equal(dco[0], co[0].toarray())
+        dpm = measure(ppmi, dco[0])
+        assert np.array_equal(dpm[0], pm[0].toarray())
+        dsv = measure(randomized_svd, dpm[0], wordvec_size, random_state=0)
+        row(vocab_size, 'dense', dco, dpm, dsv, '')
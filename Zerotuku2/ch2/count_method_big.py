@@ -1,30 +1,50 @@
 import sys
 sys.path.append('..')
-import numpy as np
 from common.util import most_similar, create_co_matrix, ppmi
-from dataset import ptb
+from common.corpus_cache import load_ptb, corpus_hash, cached
 
 window_size = 2
 wordvec_size = 100
 
-corpus, word_to_id, id_to_word = ptb.load_data('train')
+# 2回目からはキャッシュ（~/.zerotuku2）から読む。共起行列・PPMI・SVDの結果も同じ
+corpus, word_to_id, id_to_word = load_ptb('train')
 vocab_size = len(word_to_id)
-print('counting co-occurrence ...')
-C = create_co_matrix(corpus, vocab_size, window_size)
-print('calculating PPMI ...')
-W = ppmi(C, verbose=True)
-
-print('calculationg SVD...')
-try:
-    # truncated SVD(fast!)
-    from sklearn.units.extmath import randomized_svd
-    U, S, V = randomized_svd(W, n_components = wordvec_size, n_iter=5, random_state = None)
-
-except ImportError:
-    #SVD(slow)
-    U, S, V = np.linalg.svd(W)
-
-word_vecs = U[:, :wordvec_size]
+key = corpus_hash(corpus)
+
+
+def ppmi_matrix():
+    try:
+        # 疎行列（scipy）なら語彙数×語彙数の密行列（PTBで400MBずつ）を作らない
+        from common.util import create_sparse_co_matrix, sparse_ppmi
+        import scipy.sparse
+    except ImportError:
+        print('counting co-occurrence ...')
+        C = cached('co', (key, window_size), lambda: create_co_matrix(corpus, vocab_size, window_size))
+        print('calculating PPMI ...')
+        return cached('ppmi', (key, window_size), lambda: ppmi(C, verbose=True))
+
+    print('counting co-occurrence (sparse) ...')
+    C = cached('co_sparse', (key, window_size),
+               lambda: create_sparse_co_matrix(corpus, vocab_size, window_size))
+    print('calculating PPMI (sparse) ...')
+    return cached('ppmi_sparse', (key, window_size), lambda: sparse_ppmi(C))
+
+
+def svd():
+    W = ppmi_matrix()
+    print('calculationg SVD...')
+    try:
+        # truncated SVD(fast!)
+        from sklearn.utils.extmath import randomized_svd
+    except ImportError:
+        # sklearnがない場合もnumpyだけの乱択SVD（疎行列も可）を使う
+        from common.util import randomized_svd
+    U, S, V = randomized_svd(W, n_components=wordvec_size, n_iter=5, random_state=None)
+    return U[:, :wordvec_size]
+
+
+# SVDの結果がキャッシュにあれば、共起行列もPPMIも計算しない
+word_vecs = cached('svd', (key, window_size, wordvec_size), svd)
 
 querys = ['you', 'year', 'car', 'toyota']
 for query in querys:
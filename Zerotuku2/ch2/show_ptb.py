@@ -1,8 +1,9 @@
 import sys
 sys.path.append('..')
-from dataset import ptb
+from common.corpus_cache import load_ptb
 
-corpus, word_to_id, id_to_word = ptb.load_data('train')
+# 2回目からはキャッシュ（コーパスはmemmap）から読む
+corpus, word_to_id, id_to_word = load_ptb('train')
 
 print('corpus size:', len(corpus))
 print('corpus[:30]:', corpus[:30])
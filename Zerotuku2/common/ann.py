@@ -0,0 +1,130 @@
+import numpy as np
+
+# =============================================================================
+# 近似最近傍探索（IVF: inverted file index）
+# 単語ベクトルをk-meansでn_lists個のクラスタに分けておき、検索ではクエリに近い
+# n_probe個のクラスタの中だけでコサイン類似度を計算する。
+# n_probeを大きくすると再現率（recall）が上がり、検索は遅くなる
+# =============================================================================
+def _normalize(x, eps=1e-8):
+    norm = np.sqrt(np.sum(x ** 2, axis=1, keepdims=True))
+    return (x / (norm + eps)).astype(np.float32)
+
+
+def _nearest(vecs, centroids, batch_size=65536):
+    labels = np.empty(len(vecs), dtype=np.int64)
+    for start in range(0, len(vecs), batch_size):
+        labels[start:start + batch_size] = np.argmax(vecs[start:start + batch_size] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vecs, n_clusters, n_iter=10, random_state=None):
+    # 正規化したベクトルのk-means（内積が最大のクラスタに割り当て、重心も正規化する）
+    rng = np.random.default_rng(random_state)
+    centroids = vecs[rng.choice(len(vecs), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _nearest(vecs, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vecs)
+        counts = np.bincount(labels, minlength=n_clusters)
+        empty = counts == 0
+        sums[empty] = vecs[rng.choice(len(vecs), empty.sum())]  # 空のクラスタは選び直す
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, word_matrix=None, word_to_id=None, id_to_word=None,
+                 n_lists=None, n_iter=10, max_train=100000, random_state=None):
+        self.word_to_id = word_to_id
+        self.id_to_word = id_to_word
+        if word_matrix is None:  # load()から作る場合
+            return
+
+        vecs = _normalize(word_matrix)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vecs))))
+        rng = np.random.default_rng(random_state)
+        train = vecs if len(vecs) <= max_train else vecs[rng.choice(len(vecs), max_train, replace=False)]
+        centroids = spherical_kmeans(train, n_lists, n_iter, random_state)
+        self._build(vecs, centroids)
+
+    def _build(self, vecs, centroids):
+        # クラスタごとにベクトルが連続して並ぶように並べ替えておく
+        labels = _nearest(vecs, centroids)
+        self.order = np.argsort(labels, kind='stable')
+        self.offsets = np.searchsorted(labels[self.order], np.arange(len(centroids) + 1))
+        self.vecs = vecs[self.order]
+        self.centroids = centroids
+        self.position = np.empty_like(self.order)
+        self.position[self.order] = np.arange(len(self.order))
+
+    def search_vectors(self, query_vecs, top=5, n_probe=8, exclude=None):
+        '''クエリのベクトルごとに、類似度の高い単語ID（と類似度）を返す
+        :param exclude: 除外する単語ID（クエリ自身など）。クエリごとに1つ、または None
+        :return: (ids, similarities) 形状はどちらも (クエリ数, top)。見つからない分はid=-1
+        '''
+        query_vecs = _normalize(np.atleast_2d(query_vecs))
+        n_probe = min(n_probe, len(self.centroids))
+        ids = np.full((len(query_vecs), top), -1, dtype=np.int64)
+        sims = np.full((len(query_vecs), top), -np.inf, dtype=np.float32)
+
+        # 近いクラスタをまとめて選ぶ
+        probes = np.argpartition(-(query_vecs @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        for n, (q, lists) in enumerate(zip(query_vecs, probes)):
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+            if exclude is not None:
+                # 候補が少なくてもクエリ自身を返さないように、類似度を計算する前に除く
+                rows = rows[rows != self.position[exclude[n]]]
+            if len(rows) == 0:
+                continue
+            similarity = self.vecs[rows] @ q
+            k = min(top, len(rows))
+            part = np.argpartition(-similarity, k - 1)[:k]
+            part = part[np.argsort(-similarity[part], kind='stable')]
+            ids[n, :k] = self.order[rows[part]]
+            sims[n, :k] = similarity[part]
+        return ids, sims
+
+    def search(self, query_ids, top=5, n_probe=8):
+        query_ids = np.asarray(query_ids)
+        query_vecs = self.vecs[self.position[query_ids]]
+        return self.search_vectors(query_vecs, top, n_probe, exclude=query_ids)
+
+    def most_similar(self, query, top=5, n_probe=8):
+        # [(単語, 類似度), ...] を返す。クエリが見つからない場合はNone
+        if query not in self.word_to_id:
+            return None
+        ids, sims = self.search([self.word_to_id[query]], top, n_probe)
+        return [(self.id_to_word[i], float(s)) for i, s in zip(ids[0], sims[0]) if i >= 0]
+
+    @staticmethod
+    def _npz_path(path):
+        # np.savezは拡張子がなければ.npzを付けるので、loadでも同じパスにする
+        path = str(path)
+        return path if path.endswith('.npz') else path + '.npz'
+
+    def save(self, path):
+        # 単語も含めてnpzに保存する（pickleは使わない）
+        path = self._npz_path(path)
+        words = None
+        if self.id_to_word is not None:
+            words = np.array([self.id_to_word[i] for i in range(len(self.order))])
+        np.savez(path, vecs=self.vecs, order=self.order, offsets=self.offsets,
+                 centroids=self.centroids, **({} if words is None else {'words': words}))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(cls._npz_path(path)) as f:
+            index = cls()
+            index.vecs = f['vecs']
+            index.order = f['order']
+            index.offsets = f['offsets']
+            index.centroids = f['centroids']
+            if 'words' in f:
+                words = f['words'].tolist()
+                index.id_to_word = dict(enumerate(words))
+                index.word_to_id = {w: i for i, w in enumerate(words)}
+        index.position = np.empty_like(index.order)
+        index.position[index.order] = np.arange(len(index.order))
+        return index
@@ -0,0 +1,117 @@
+import os
+import hashlib
+import numpy as np
+
+# =============================================================================
+# コーパスと計算結果のキャッシュ
+# コーパス（単語ID）は.npyにしてmemmapで読み、語彙は単語をソートして
+# 1つのバイト列（UTF-8）とオフセットにまとめて保存する。
+# 共起行列・PPMI・SVDの結果は (コーパスのハッシュ, window_size, wordvec_size) をキーに保存する
+# =============================================================================
+cache_dir = os.path.join(os.path.expanduser('~'), '.zerotuku2')
+
+
+def _path(name, directory=None):
+    if directory is None:
+        directory = cache_dir
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def _replace(save, path):
+    # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+    tmp = path + '.tmp%d' % os.getpid()
+    with open(tmp, 'wb') as f:
+        save(f)
+    os.replace(tmp, path)
+
+
+def save_vocab(path, word_to_id):
+    words = sorted(word_to_id)
+    encoded = [w.encode('utf-8') for w in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    table = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    ids = np.array([word_to_id[w] for w in words], dtype=np.int32)
+    _replace(lambda f: np.savez(f, table=table, offsets=offsets, ids=ids), path)
+
+
+def load_vocab(path):
+    with np.load(path) as f:
+        table = f['table'].tobytes()
+        offsets = f['offsets'].tolist()
+        ids = f['ids'].tolist()
+    words = [table[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(ids))]
+    word_to_id = dict(zip(words, ids))
+    id_to_word = dict(sorted(zip(ids, words)))
+    return word_to_id, id_to_word
+
+
+def corpus_hash(corpus):
+    # memmapで読んだコーパスは、保存したときのハッシュ（.sha1）を使う
+    filename = getattr(corpus, 'filename', None)
+    if filename is not None and os.path.exists(filename + '.sha1'):
+        with open(filename + '.sha1') as f:
+            return f.read()
+    corpus = np.ascontiguousarray(corpus, dtype=np.int32)
+    return hashlib.sha1(corpus.view(np.uint8)).hexdigest()[:16]
+
+
+def save_corpus(name, corpus, word_to_id, cache_dir=None):
+    corpus = np.asarray(corpus, dtype=np.int32)
+    path = _path(name + '.corpus.npy', cache_dir)
+    _replace(lambda f: np.save(f, corpus), path)
+    with open(path + '.sha1', 'w') as f:
+        f.write(corpus_hash(corpus))
+    save_vocab(_path(name + '.vocab.npz', cache_dir), word_to_id)
+
+
+def load_corpus(name, cache_dir=None):
+    '''保存したコーパスを読む。なければNone
+    :return: corpus（読み取り専用のmemmap）, word_to_id, id_to_word
+    '''
+    path = _path(name + '.corpus.npy', cache_dir)
+    vocab_path = _path(name + '.vocab.npz', cache_dir)
+    if not (os.path.exists(path) and os.path.exists(vocab_path)):
+        return None
+    corpus = np.load(path, mmap_mode='r')
+    word_to_id, id_to_word = load_vocab(vocab_path)
+    return corpus, word_to_id, id_to_word
+
+
+def cached_corpus(name, load_data, cache_dir=None):
+    # 2回目からはload_data()を呼ばずにキャッシュから読む
+    result = load_corpus(name, cache_dir)
+    if result is None:
+        corpus, word_to_id, id_to_word = load_data()
+        save_corpus(name, corpus, word_to_id, cache_dir)
+        result = load_corpus(name, cache_dir)
+    return result
+
+
+def load_ptb(data_type='train', cache_dir=None):
+    def load_data():
+        from dataset import ptb
+        return ptb.load_data(data_type)
+    return cached_corpus('ptb.' + data_type, load_data, cache_dir)
+
+
+def cached(name, key, compute, cache_dir=None):
+    '''compute()の結果（ndarrayまたはscipyの疎行列）をキーごとに保存しておく
+    例: cached('ppmi', (corpus_hash(corpus), window_size), lambda: ppmi(C))
+    '''
+    filename = '%s_%s' % (name, '_'.join(str(k) for k in key))
+    npy, npz = _path(filename + '.npy', cache_dir), _path(filename + '.npz', cache_dir)
+    if os.path.exists(npy):
+        return np.load(npy, mmap_mode='r')
+    if os.path.exists(npz):
+        from scipy import sparse
+        return sparse.load_npz(npz)
+
+    value = compute()
+    if hasattr(value, 'tocsr'):  # 疎行列
+        from scipy import sparse
+        _replace(lambda f: sparse.save_npz(f, value.tocsr()), npz)
+    else:
+        _replace(lambda f: np.save(f, value), npy)
+    return value
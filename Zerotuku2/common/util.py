@@ -1,4 +1,5 @@
 import numpy as np
+from array import array
 
 def preprocess(text):
     text = text.lower()
@@ -19,25 +20,119 @@ def preprocess(text):
     return corpus, word_to_id, id_to_word
 
 
+class _Vocab(dict):
+    # 知らない単語を引くと、新しいIDを割り当てる
+    def __missing__(self, word):
+        new_id = self[word] = len(self)
+        return new_id
+
+
+def iter_tokens(f, chunk_size=1 << 20):
+    '''ファイルをchunk_size文字ずつ読み、preprocessと同じ規則で分割した単語をチャンクごとに返す
+    最後の空白より後ろは次のチャンクにつなげるので、text.split(' ')と同じ結果になる
+    '''
+    carry = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        text = carry + chunk
+        idx = text.rfind(' ')
+        if idx < 0:
+            carry = text
+            continue
+        carry = text[idx + 1:]
+        yield text[:idx].lower().replace('.', ' .').split(' ')
+    yield carry.lower().replace('.', ' .').split(' ')
+
+
+def preprocess_file(path, min_count=1, max_vocab=None, unk=None, chunk_size=1 << 20, encoding='utf-8'):
+    '''大きなテキストファイル用のpreprocess（ファイルを少しずつ読む）
+    :param min_count: 出現回数がこれより少ない単語を除く
+    :param max_vocab: 語彙数の上限（出現回数の多い順に残す）
+    :param unk: 除いた単語を置き換える単語（'<unk>'など）。Noneならコーパスから取り除く
+    :return: corpus（int32）, word_to_id, id_to_word（IDは最初に出てきた順）
+    '''
+    vocab = _Vocab()
+    ids = array('i')  # 単語IDを1つ4バイトで詰めていく
+    with open(path, encoding=encoding) as f:
+        for words in iter_tokens(f, chunk_size):
+            ids.extend(map(vocab.__getitem__, words))
+    corpus = np.frombuffer(ids, dtype=np.int32)
+
+    counts = np.bincount(corpus, minlength=len(vocab))
+    keep = counts >= min_count
+    if unk is not None and unk in vocab:
+        keep[vocab[unk]] = True
+    if max_vocab is not None and keep.sum() > max_vocab:
+        if unk is not None and unk not in vocab:
+            max_vocab -= 1  # <unk>の分
+        order = np.argsort(-np.where(keep, counts, -1), kind='stable')  # 同じ回数なら先に出た単語
+        if unk is not None and unk in vocab:
+            order = np.concatenate([[vocab[unk]], order[order != vocab[unk]]])
+        keep[:] = False
+        keep[order[:max_vocab]] = True
+
+    words = list(vocab)
+    if keep.all():
+        word_to_id = dict(vocab)
+    else:
+        # 残す単語のIDを詰め直す
+        new_ids = np.cumsum(keep) - 1
+        if unk is None:
+            corpus = new_ids[corpus[keep[corpus]]].astype(np.int32)
+        else:
+            unk_id = new_ids[vocab[unk]] if unk in vocab else keep.sum()
+            new_ids[~keep] = unk_id
+            corpus = new_ids[corpus].astype(np.int32)
+        word_to_id = {w: int(i) for w, i, k in zip(words, new_ids, keep) if k}
+        if unk is not None:
+            word_to_id.setdefault(unk, int(unk_id))
+    id_to_word = {i: w for w, i in word_to_id.items()}
+
+    return corpus, word_to_id, id_to_word
+
+
+def _co_pair_ids(corpus, vocab_size, window_size):
+    # 単語の組を通し番号（word_id * vocab_size + context_id）にして、まとめて数えられるようにする
+    corpus = np.asarray(corpus, dtype=np.int64)
+    pair_ids = [np.empty(0, dtype=np.int64)]  # window_size < 1 の場合は組なし
+    for i in range(1, window_size + 1):
+        center, context = corpus[i:], corpus[:-i]  # i個左の単語との組
+        pair_ids.append(center * vocab_size + context)
+        pair_ids.append(context * vocab_size + center)  # i個右の単語との組
+    return np.concatenate(pair_ids)
+
+
 # 共起行列（co-occurence matrix）P72
 def create_co_matrix(corpus, vocab_size, window_size=1):
-    corpus_size = len(corpus)
     co_matrix = np.zeros((vocab_size, vocab_size), dtype=np.int32)
+    pair_ids = _co_pair_ids(corpus, vocab_size, window_size)
+    if len(pair_ids) == 0:
+        return co_matrix
+
+    if vocab_size * vocab_size <= 4 * len(pair_ids):
+        # 語彙が小さい場合は全セル分のbincount
+        counts = np.bincount(pair_ids, minlength=vocab_size * vocab_size)
+        co_matrix += counts.reshape(vocab_size, vocab_size).astype(np.int32)
+    else:
+        # 語彙が大きい場合は出てきた組だけを数える
+        ids, counts = np.unique(pair_ids, return_counts=True)
+        co_matrix.ravel()[ids] = counts
 
-    for idx, word_id in enumerate(corpus):
-        for i in range(1, window_size + 1):
-            left_idx = idx - i
-            right_idx = idx + i
+    return co_matrix
 
-            if left_idx >= 0:
-                left_word_id = corpus[left_idx]
-                co_matrix[word_id, left_word_id] += 1
 
-            if right_idx < corpus_size:
-                right_word_id = corpus[right_idx]
-                co_matrix[word_id, right_word_id] += 1
+# 疎行列（CSR）の共起行列。語彙数の2乗のメモリを使わない（scipyが必要）
+def create_sparse_co_matrix(corpus, vocab_size, window_size=1):
+    from scipy import sparse
 
-    return co_matrix
+    pair_ids = _co_pair_ids(corpus, vocab_size, window_size)
+    ids, counts = np.unique(pair_ids, return_counts=True)  # 行、列の順に並ぶ
+    rows, cols = np.divmod(ids, vocab_size)
+    indptr = np.searchsorted(rows, np.arange(vocab_size + 1))
+    return sparse.csr_matrix((counts.astype(np.int32), cols.astype(np.int32), indptr),
+                             shape=(vocab_size, vocab_size))
 
 # コサイン類似度
 def cos_similarity(x, y, eps=1e-8):
@@ -45,6 +140,53 @@ def cos_similarity(x, y, eps=1e-8):
     ny = y / (np.sqrt(np.sum(y ** 2)) + eps)
     return np.dot(nx, ny)
 
+# 類似単語の検索。行を一度だけ正規化しておき、クエリとの内積（行列積）でまとめてコサイン類似度を求める
+class SimilarityIndex:
+    def __init__(self, word_matrix, word_to_id, id_to_word, eps=1e-8):
+        norm = np.sqrt(np.sum(word_matrix ** 2, axis=1, keepdims=True))
+        self.vecs = word_matrix / (norm + eps)
+        self.word_to_id = word_to_id
+        self.id_to_word = id_to_word
+
+    def search(self, query_ids, top=5, batch_size=1024):
+        '''クエリの単語IDごとに、類似度の高い単語（クエリ自身は除く）を返す
+        :param query_ids: 単語IDのリスト
+        :return: (ids, similarities) 形状はどちらも (クエリ数, top)
+        '''
+        query_ids = np.asarray(query_ids)
+        top = min(top, len(self.vecs) - 1)
+        ids = np.empty((len(query_ids), top), dtype=np.int64)
+        sims = np.empty((len(query_ids), top), dtype=self.vecs.dtype)
+
+        for start in range(0, len(query_ids), batch_size):
+            q = query_ids[start:start + batch_size]
+            similarity = self.vecs[q] @ self.vecs.T
+            similarity[np.arange(len(q)), q] = -np.inf  # クエリ自身
+
+            # 上位top個だけをargpartitionで取り出してから並べる
+            part = np.argpartition(-similarity, top - 1, axis=1)[:, :top]
+            part.sort(axis=1)  # 類似度が同じ場合は単語IDの順
+            part_sims = np.take_along_axis(similarity, part, axis=1)
+            order = np.argsort(-part_sims, axis=1, kind='stable')
+            ids[start:start + batch_size] = np.take_along_axis(part, order, axis=1)
+            sims[start:start + batch_size] = np.take_along_axis(part_sims, order, axis=1)
+        return ids, sims
+
+    def most_similar(self, query, top=5):
+        # [(単語, 類似度), ...] を返す。クエリが見つからない場合はNone
+        result = self.most_similar_batch([query], top)
+        return result[0]
+
+    def most_similar_batch(self, queries, top=5):
+        found = [q for q in queries if q in self.word_to_id]
+        results = dict.fromkeys(queries)
+        if found:
+            ids, sims = self.search([self.word_to_id[q] for q in found], top)
+            for q, row_ids, row_sims in zip(found, ids, sims):
+                results[q] = [(self.id_to_word[i], float(sim)) for i, sim in zip(row_ids, row_sims)]
+        return [results[q] for q in queries]
+
+
 #類似単語のランキング表示2.3.6
 def most_similar(query, word_to_id, id_to_word, word_matrix, top=5):
     #クエリを取り出す
@@ -53,47 +195,74 @@ def most_similar(query, word_to_id, id_to_word, word_matrix, top=5):
         return
 
     print('\n[query]' + query)
-    query_id = word_to_id[query]
-    query_vec = word_matrix[query_id]
-
-    #コサイン類似度の算出
-    vocab_size = len(id_to_word)
-    similarity = np.zeros(vocab_size)
-    for i in range(vocab_size):
-        similarity[i] = cos_similarity(word_matrix[i], query_vec)
-
-    #コサイン類似度の結果から、その値を高い順に出力
-    count = 0
-    for i in (-1 * similarity).argsort():
-        if id_to_word[i] == query:
-            continue
-        print(' %s: %s' % (id_to_word[i], similarity[i]))
 
-        count += 1
-        if count >= top:
-            return
+    #コサイン類似度の高い順に出力（何度も検索する場合はSimilarityIndexを使い回す）
+    index = SimilarityIndex(word_matrix, word_to_id, id_to_word)
+    for word, similarity in index.most_similar(query, top):
+        print(' %s: %s' % (word, similarity))
 
 
 #正の相互情報量の導入
-def ppmi(C, verbose=False, eps = 1e-8):
+def ppmi(C, verbose=False, eps = 1e-8, out=None, chunk_size=None):
     '''PPMI（正の相互情報量）の作成
     :param C: 共起行列
     :param verbose: 進行状況を出力するかどうか
+    :param out: 結果を書き込む配列（np.memmapなど）。Noneなら新しく確保する
+    :param chunk_size: 一度に計算する行数。Noneなら作業用の配列が1つ16MB程度になるように決める
     :return:
     '''
-    M = np.zeros_like(C, dtype=np.float32)
+    M = np.empty(C.shape, dtype=np.float32) if out is None else out
     N = np.sum(C)
     S = np.sum(C, axis=0)
-    total = C.shape[0] * C.shape[1]
-    cnt = 0
+    n_rows, n_cols = C.shape
+    if chunk_size is None:
+        chunk_size = max(1, 2**21 // max(1, n_cols))  # float64で2M要素
 
-    for i in range(C.shape[0]):
-        for j in range(C.shape[1]):
-            pmi = np.log2(C[i, j] * N / (S[j]*S[i]) + eps)
-            M[i, j] = max(0, pmi)
+    # S[i]*S[j]が0のセル（0/0でnan）は、元の実装のmax(0, pmi)と同じく0にする（np.fmax）
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            pmi = C[start:stop] * N / np.outer(S[start:stop], S)
+            pmi += eps
+            np.log2(pmi, out=pmi)
+            M[start:stop] = np.fmax(0, pmi)
 
             if verbose:
-                cnt += 1
-                if cnt % (total//100 + 1) == 0:
-                    print('%.1f%% done' % (100*cnt/total))
+                print('%.1f%% done' % (100 * stop / n_rows))
     return M
+
+
+# 疎行列のPPMI。共起回数が0のセルのPMIは負になる（PPMIは0）ので、0でないセルだけ計算する
+def sparse_ppmi(C, eps=1e-8):
+    from scipy import sparse
+
+    C = sparse.csr_matrix(C)
+    N = C.sum(dtype=np.int64)
+    S = np.asarray(C.sum(axis=0, dtype=np.int64)).ravel()
+    rows = np.repeat(np.arange(C.shape[0]), np.diff(C.indptr))
+    cols = C.indices
+
+    pmi = np.log2(C.data * N / (S[cols] * S[rows]) + eps)
+    # eliminate_zerosはindicesとindptrをその場で書き換えるので、Cとは共有しない
+    M = sparse.csr_matrix((np.maximum(0, pmi).astype(np.float32), cols.copy(), C.indptr.copy()),
+                          shape=C.shape)
+    M.eliminate_zeros()
+    return M
+
+
+# truncated SVD（乱択アルゴリズム）。M @ x と M.T @ x しか使わないので、疎行列でもよい
+def randomized_svd(M, n_components, n_oversamples=10, n_iter=5, random_state=None):
+    rng = np.random.default_rng(random_state)
+    k = n_components + n_oversamples
+    Q = rng.standard_normal((M.shape[1], k)).astype(M.dtype)
+
+    # べき乗法で上位の特異ベクトルの成分を強める（毎回QR分解して数値誤差を抑える）
+    Q, _ = np.linalg.qr(M @ Q)
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(M.T @ Q)
+        Q, _ = np.linalg.qr(M @ Q)
+
+    B = np.asarray((M.T @ Q).T)  # Q.T @ M
+    U_hat, S, V = np.linalg.svd(B, full_matrices=False)
+    U = Q @ U_hat
+    return U[:, :n_components], S[:n_components], V[:n_components]
@@ -0,0 +1,95 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import types
+import numpy as np
+from dezero import Variable, using_config
+from dezero import cuda
+from dezero.fusion import fuse
+
+# 1. 偽のバックエンドを登録して、逆伝播がそのモジュール（xp）を使うことを確かめる
+# 2. Config.dtype = np.float32 で計算グラフ全体をfloat32にした場合の時間・メモリを比べる
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+# =============================================================================
+# 偽のバックエンド（NumPyの配列のサブクラス + 呼び出し回数を数えるモジュール）
+# =============================================================================
+class FakeArray(np.ndarray):
+    pass
+
+
+calls = {}
+
+
+def _counted(name):
+    def f(*args, **kwargs):
+        calls[name] = calls.get(name, 0) + 1
+        y = getattr(np, name)(*args, **kwargs)
+        return y.view(FakeArray) if isinstance(y, np.ndarray) else y
+    return f
+
+
+fake = types.SimpleNamespace(**{name: _counted(name)
+                                for name in ['ones_like', 'zeros', 'empty', 'asarray',
+                                             'add', 'shape', 'result_type']})
+cuda.register_backend(FakeArray, fake)
+
+a = np.array(1.0).view(FakeArray)
+b = np.array(1.0).view(FakeArray)
+x = Variable(a)
+y = Variable(b)
+z = goldstein(x, y)
+z.backward()
+print('fake backend')
+print('  output type:', type(z.data).__name__, ' grad type:', type(x.grad).__name__)
+print('  grad:', float(x.grad), float(y.grad), ' calls:', calls)
+
+# インプレースの勾配の加算もxpを通す
+calls.clear()
+x = Variable(a)
+y = Variable(b)
+goldstein(x, y).backward(inplace_grad=True)
+print('  inplace_grad:', float(x.grad), float(y.grad), ' calls:', calls)
+
+try:
+    Variable([1.0])
+except TypeError as e:
+    print('  list is rejected:', e)
+
+# =============================================================================
+# float64 / float32
+# =============================================================================
+def bench(f, a, b, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        x = Variable(a)
+        y = Variable(b)
+        start = time.perf_counter()
+        z = f(x, y)
+        z.backward()
+        best = min(best, time.perf_counter() - start)
+    return z, x.grad, best
+
+
+size = 1000000
+np.random.seed(0)
+a = np.random.rand(size) * 0.5
+b = np.random.rand(size) * 0.5
+
+print()
+print('{:>10} {:>8} {:>10} {:>12} {:>10}'.format('func', 'dtype', 'time[ms]', 'grad bytes', 'max err'))
+fused = fuse(goldstein)
+for f, name in [(goldstein, 'goldstein'), (fused, 'fused')]:
+    z64, gx64, t64 = bench(f, a, b)
+    with using_config('dtype', np.float32):
+        z32, gx32, t32 = bench(f, a, b)
+    err = np.max(np.abs(gx32 - gx64) / np.maximum(np.abs(gx64), 1))
+    print('{:>10} {:>8} {:>10.1f} {:>12} {:>10}'.format(name, str(gx64.dtype), t64 * 1e3, gx64.nbytes, '-'))
+    print('{:>10} {:>8} {:>10.1f} {:>12} {:>10.2e}'.format(name, str(gx32.dtype), t32 * 1e3, gx32.nbytes, err))
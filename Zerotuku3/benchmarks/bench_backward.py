@@ -0,0 +1,58 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable, using_config, HeapScheduler, SortScheduler
+
+# 逆伝播のスケジューラ（SortScheduler: 以前の実装 / HeapScheduler: heapq）の比較
+# グラフのノード数を増やしたときに逆伝播の時間がどう伸びるかを見る
+
+
+def chain(x, n):
+    # 直列：y = x + 1 + 1 + ...
+    y = x
+    for i in range(n):
+        y = y + 1
+    return y
+
+
+def fan_in(x, n):
+    # 幅広い合流：n個の項を作ってから足し合わせる
+    ts = [x * i for i in range(n)]
+    y = ts[0]
+    for t in ts[1:]:
+        y = y + t
+    return y
+
+
+def diamond(x, n):
+    # ひし形の繰り返し：a = y*0.5, b = y*0.5, y = a + b
+    y = x
+    for i in range(n // 3):
+        a = y * 0.5
+        b = y * 0.5
+        y = a + b
+    return y
+
+
+def bench(graph, n, scheduler, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        x = Variable(np.array(1.0))
+        y = graph(x, n)
+        with using_config('scheduler', scheduler):
+            start = time.perf_counter()
+            y.backward()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+sizes = [1000, 2000, 4000, 8000]
+for graph in [chain, fan_in, diamond]:
+    print('--- {} ---'.format(graph.__name__))
+    print('{:>8} {:>12} {:>12}'.format('nodes', 'sort[ms]', 'heap[ms]'))
+    for n in sizes:
+        t_sort = bench(graph, n, SortScheduler)
+        t_heap = bench(graph, n, HeapScheduler)
+        print('{:>8} {:>12.2f} {:>12.2f}'.format(n, t_sort * 1e3, t_heap * 1e3))
@@ -0,0 +1,49 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+
+# step28の勾配降下法を、たくさんの初期値についてまとめて（バッチで）実行する。
+# x0, x1に1次元配列を持たせると、yの各要素は互いに独立なので、
+# y.backward()（起点の勾配は1の配列）でそれぞれの点の勾配がまとめて求まる
+
+
+def rosenbrock(x0, x1):
+    y = 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return y
+
+
+def gradient_descent(x0, x1, lr=0.001, iters=1000):
+    x0 = Variable(np.array(x0, dtype=np.float64))
+    x1 = Variable(np.array(x1, dtype=np.float64))
+    for i in range(iters):
+        y = rosenbrock(x0, x1)
+        x0.cleargrad()
+        x1.cleargrad()
+        y.backward()
+
+        x0.data -= lr * x0.grad
+        x1.data -= lr * x1.grad
+    return x0.data, x1.data
+
+
+np.random.seed(0)
+iters = 1000
+for n_points in [10, 100, 1000, 10000]:
+    starts = np.random.uniform([[-1.0], [0.0]], [[1.0], [2.0]], size=(2, n_points))
+
+    start = time.perf_counter()
+    batch = gradient_descent(starts[0], starts[1], iters=iters)
+    t_batch = time.perf_counter() - start
+
+    # 1点ずつのループは時間がかかるので、最大20点だけ計って全体を見積もる
+    n_loop = min(n_points, 20)
+    start = time.perf_counter()
+    loop = [gradient_descent(starts[0, i], starts[1, i], iters=iters) for i in range(n_loop)]
+    t_loop = (time.perf_counter() - start) * n_points / n_loop
+
+    same = np.allclose(np.array(loop).T, np.stack(batch)[:, :n_loop])
+    print('points={:>6}  loop={:>8.2f}s  batch={:>7.3f}s  speedup={:>8.1f}x  same={}'.format(
+        n_points, t_loop, t_batch, t_loop / t_batch, same))
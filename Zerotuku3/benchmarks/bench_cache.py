@@ -0,0 +1,61 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable, no_grad
+from dezero.core_simple import sum_to
+from dezero.cache import memoize
+
+# 最適化のループで、変わらない変数（w0, w1）だけから計算する部分式を
+# 毎回計算する場合と、dezero.cacheで使い回す場合を比べる
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def fit(w0, w1, iters=100, lr=0.1):
+    # x を goldstein(w0, w1) / 1e4 に近づける
+    x = Variable(np.zeros(w0.shape))
+    for i in range(iters):
+        with no_grad():
+            t = goldstein(w0, w1) / 1e4  # w0, w1は変わらないのでキャッシュできる
+        loss = sum_to((x - t) ** 2, ())
+        x.grad = None
+        loss.backward()
+        x.data -= lr * x.grad
+    return x, loss
+
+
+size = 100000
+np.random.seed(0)
+w0 = Variable(np.random.rand(size) * 0.5)
+w1 = Variable(np.random.rand(size) * 0.5)
+
+start = time.perf_counter()
+x, loss = fit(w0, w1)
+plain = time.perf_counter() - start
+
+with memoize() as cache:
+    start = time.perf_counter()
+    cx, closs = fit(w0, w1)
+    cached = time.perf_counter() - start
+print('plain : {:.1f}ms  loss={:.6e}'.format(plain * 1e3, float(loss.data)))
+print('cached: {:.1f}ms  loss={:.6e}'.format(cached * 1e3, float(closs.data)))
+print('speedup: {:.2f}x  same result: {}'.format(plain / cached, np.array_equal(x.data, cx.data)))
+print(cache)
+
+# w0を書き換えると版が上がり、部分式は計算し直される
+with memoize(cache=cache):
+    with no_grad():
+        before = goldstein(w0, w1)
+        w0.data = w0.data + 0.1
+        after = goldstein(w0, w1)
+with no_grad():
+    expected = goldstein(w0, w1)
+print('after update: recomputed={}  correct={}'.format(
+    before is not after, np.array_equal(after.data, expected.data)))
+print(cache)
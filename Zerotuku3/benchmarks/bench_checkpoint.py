@@ -0,0 +1,45 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+from dezero import Variable
+from dezero.checkpoint import checkpoint_sequential
+
+# 長い直列の計算で、gradient checkpointingを使った場合のピークメモリと
+# 再計算による時間の増加を比べる
+
+
+def layer(x):
+    return (x * 0.99 + 0.01) ** 2
+
+
+size = 100000  # 800KB / 配列
+n = 200
+functions = [layer] * n
+
+print('{:>10} {:>12} {:>10} {:>8}'.format('segments', 'peak[MB]', 'time[ms]', 'same'))
+x_data = np.random.rand(size)
+expected = None
+for segments in [None, 40, 14, 5]:
+    x = Variable(x_data.copy())
+    tracemalloc.start()
+    start = time.perf_counter()
+    if segments is None:
+        y = x
+        for f in functions:
+            y = f(y)
+    else:
+        y = checkpoint_sequential(functions, segments, x)
+    y.backward()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if expected is None:
+        expected = x.grad
+    print('{:>10} {:>12.1f} {:>10.1f} {:>8}'.format(
+        'none' if segments is None else segments, peak / 2**20, elapsed * 1e3,
+        str(np.allclose(expected, x.grad))))
+    del y
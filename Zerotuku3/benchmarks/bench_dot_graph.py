@@ -0,0 +1,74 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import io
+import time
+import numpy as np
+from dezero import Variable
+from dezero.utils import get_dot_graph, write_dot_graph, _dot_var
+
+# 大きな計算グラフのDOT出力を、以前の実装（文字列の連結・変数の重複出力）と比べる
+
+
+def _old_dot_func(f):
+    dot_func = '{}[label="{}", color=lightblue, style=filled, shape=box]\n'
+    txt = dot_func.format(id(f), f.__class__.__name__)
+    dot_edge = '{} -> {}\n'
+    for x in f.inputs:
+        txt += dot_edge.format(id(x), id(f))
+    for y in f.outputs:
+        txt += dot_edge.format(id(f), id(y()))
+    return txt
+
+
+def old_get_dot_graph(output, verbose=True):
+    txt = ''
+    funcs = []
+    seen_set = set()
+
+    def add_func(f):
+        if f not in seen_set:
+            funcs.append(f)
+            seen_set.add(f)
+
+    add_func(output.creator)
+    txt += _dot_var(output, verbose)
+    while funcs:
+        func = funcs.pop()
+        txt += _old_dot_func(func)
+        for x in func.inputs:
+            txt += _dot_var(x, verbose)
+            if x.creator is not None:
+                add_func(x.creator)
+    return 'digraph g {\n' + txt + '}'
+
+
+def build(n):
+    # 同じ変数xを何度も使う（以前の実装ではxのノードがn回出力される）
+    x = Variable(np.array(1.0), name='x')
+    y = x
+    for i in range(n):
+        y = y * 0.5 + x
+    return y
+
+
+print('{:>8} {:>10} {:>12} {:>10} {:>12} {:>12}'.format(
+    'funcs', 'old[ms]', 'old[bytes]', 'new[ms]', 'new[bytes]', 'limit[ms]'))
+for n in [1000, 10000, 50000]:
+    y = build(n)
+
+    start = time.perf_counter()
+    old = old_get_dot_graph(y)
+    t_old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    buf = io.StringIO()
+    write_dot_graph(y, buf)
+    t_new = time.perf_counter() - start
+
+    start = time.perf_counter()
+    limited = get_dot_graph(y, max_nodes=1000)
+    t_limit = time.perf_counter() - start
+
+    print('{:>8} {:>10.1f} {:>12} {:>10.1f} {:>12} {:>12.1f}'.format(
+        2 * n, t_old * 1e3, len(old), t_new * 1e3, len(buf.getvalue()), t_limit * 1e3))
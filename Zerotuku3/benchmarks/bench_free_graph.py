@@ -0,0 +1,40 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+from dezero import Variable
+
+# 長い直列の計算グラフで、backward(retain_graph=False)により途中の変数を解放した場合の
+# メモリ使用量を比べる。出力yを（損失の記録などで）持ち続けたときに、
+# 以前はグラフ全体が残っていた
+
+
+def chain(x, n):
+    y = x
+    for i in range(n):
+        y = y * 1.0001 + 0.5
+    return y
+
+
+size = 100000  # 800KB / 配列
+for n in [50, 100, 200]:
+    for retain_graph in [True, False]:
+        x = Variable(np.random.rand(size))
+        tracemalloc.start()
+        y = chain(x, n)
+        forward_mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        y.backward(retain_graph=retain_graph)
+        elapsed = time.perf_counter() - start
+
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('n={:>4} retain_graph={:<5}  forward={:>7.1f}MB  backward peak={:>7.1f}MB  '
+              'after backward (y kept)={:>7.1f}MB  {:>6.1f}ms'.format(
+                  n, str(retain_graph), forward_mem / 2**20, peak / 2**20, after / 2**20,
+                  elapsed * 1e3))
+        del y
@@ -0,0 +1,69 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+from dezero.fusion import fuse
+
+# 要素ごとの演算を融合した場合の、計算グラフのノード数と時間（大きな配列）を比べる
+
+
+def sphere(x, y):
+    z = x ** 2 + y ** 2
+    return z
+
+
+def matyas(x, y):
+    z = 0.26 * (x ** 2 + y ** 2) - 0.48 * x * y
+    return z
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def count_nodes(z):
+    funcs = [z.creator]
+    seen_set = {z.creator}
+    while funcs:
+        f = funcs.pop()
+        for x in f.inputs:
+            if x.creator is not None and x.creator not in seen_set:
+                seen_set.add(x.creator)
+                funcs.append(x.creator)
+    return len(seen_set)
+
+
+def bench(f, a, b, repeat=5):
+    best_fwd = best_bwd = float('inf')
+    for _ in range(repeat):
+        x = Variable(a)
+        y = Variable(b)
+        start = time.perf_counter()
+        z = f(x, y)
+        mid = time.perf_counter()
+        z.backward()
+        end = time.perf_counter()
+        best_fwd = min(best_fwd, mid - start)
+        best_bwd = min(best_bwd, end - mid)
+    return z, x.grad, y.grad, best_fwd, best_bwd
+
+
+size = 1000000
+np.random.seed(0)
+a = np.random.rand(size)
+b = np.random.rand(size)
+
+print('{:>10} {:>12} {:>10} {:>10} {:>10} {:>10} {:>6}'.format(
+    'func', 'nodes', 'fwd[ms]', 'bwd[ms]', 'fused fwd', 'fused bwd', 'same'))
+for f in [sphere, matyas, goldstein]:
+    z, gx, gy, fwd, bwd = bench(f, a, b)
+    fused = fuse(f)
+    fz, fgx, fgy, ffwd, fbwd = bench(fused, a, b)
+    same = np.allclose(z.data, fz.data) and np.allclose(gx, fgx) and np.allclose(gy, fgy)
+    nodes = '{} -> {}'.format(count_nodes(z), count_nodes(fz))
+    print('{:>10} {:>12} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>6}'.format(
+        f.__name__, nodes, fwd * 1e3, bwd * 1e3, ffwd * 1e3, fbwd * 1e3, str(same)))
@@ -0,0 +1,64 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import tracemalloc
+import numpy as np
+from dezero import Variable
+
+# step24のテスト関数について、計算グラフの構築にかかる時間とメモリを測る
+
+
+def sphere(x, y):
+    z = x ** 2 + y ** 2
+    return z
+
+
+def matyas(x, y):
+    z = 0.26 * (x ** 2 + y ** 2) - 0.48 * x * y
+    return z
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def count_nodes(z):
+    # 計算グラフ中の関数の数を数える
+    funcs = [z.creator]
+    seen_set = {z.creator}
+    while funcs:
+        f = funcs.pop()
+        for x in f.inputs:
+            if x.creator is not None and x.creator not in seen_set:
+                seen_set.add(x.creator)
+                funcs.append(x.creator)
+    return len(seen_set)
+
+
+n_graphs = 2000
+x = Variable(np.array(1.0))
+y = Variable(np.array(1.0))
+
+print('{:>10} {:>7} {:>14} {:>14} {:>14}'.format(
+    'func', 'nodes', 'build[us]', 'bytes/graph', 'bytes/node'))
+for f in [sphere, matyas, goldstein]:
+    nodes = count_nodes(f(x, y))
+
+    start = time.perf_counter()
+    for i in range(n_graphs):
+        f(x, y)
+    elapsed = time.perf_counter() - start
+
+    # グラフを保持したまま確保したメモリ量
+    tracemalloc.start()
+    zs = [f(x, y) for i in range(n_graphs)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del zs
+
+    print('{:>10} {:>7} {:>14.1f} {:>14.0f} {:>14.0f}'.format(
+        f.__name__, nodes, elapsed / n_graphs * 1e6,
+        current / n_graphs, current / n_graphs / nodes))
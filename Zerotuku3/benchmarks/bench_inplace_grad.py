@@ -0,0 +1,41 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+from dezero.core_simple import BackwardStats
+
+# goldstein関数（x0, x1がそれぞれ約10回使われる）で、勾配の加算をインプレースにした場合の
+# 配列の確保回数と逆伝播の時間を比べる
+
+
+def goldstein(x0, x1):
+    y = (1 + (x0 + x1 + 1)**2 * (19 - 14*x0 + 3*x0**2 - 14*x1 + 6*x0*x1 + 3*x1**2)) *\
+        (30 + (2*x0 - 3*x1)**2 * (18 - 32*x0 + 12*x0**2 + 48*x1 - 36*x0*x1 + 27*x1**2))
+    return y
+
+
+np.random.seed(0)
+for size in [1, 10000, 1000000]:
+    x0_data = np.random.rand(size)
+    x1_data = np.random.rand(size)
+    results = {}
+    for inplace in [False, True]:
+        best = float('inf')
+        for _ in range(5):
+            x0 = Variable(x0_data.copy())
+            x1 = Variable(x1_data.copy())
+            y = goldstein(x0, x1)
+            stats = BackwardStats()
+            start = time.perf_counter()
+            y.backward(inplace_grad=inplace, stats=stats)
+            best = min(best, time.perf_counter() - start)
+        results[inplace] = (best, stats.allocs, stats.inplace, x0.grad, x1.grad)
+
+    same = all(np.allclose(results[False][i], results[True][i]) for i in (3, 4))
+    print('size={:>8}  same grad: {}'.format(size, same))
+    for inplace in [False, True]:
+        t, allocs, n_inplace = results[inplace][:3]
+        print('  inplace_grad={:<5}  {:>8.2f}ms  allocs={:>3}  inplace={:>3}'.format(
+            str(inplace), t * 1e3, allocs, n_inplace))
@@ -0,0 +1,73 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+
+# ローゼンブロック関数の最小化を、勾配降下法（step28）とニュートン法で比べる。
+# ニュートン法のヘッセ行列は、create_graph=Trueで求めた勾配をもう一度逆伝播して求める（2階微分）
+
+
+def rosenbrock(x0, x1):
+    y = 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return y
+
+
+def converged(x0, x1, tol):
+    return abs(x0.data - 1.0) < tol and abs(x1.data - 1.0) < tol
+
+
+def gradient_descent(tol, lr=0.001, max_iters=100000):
+    x0 = Variable(np.array(0.0))
+    x1 = Variable(np.array(2.0))
+    for i in range(max_iters):
+        if converged(x0, x1, tol):
+            break
+        y = rosenbrock(x0, x1)
+        x0.cleargrad()
+        x1.cleargrad()
+        y.backward()
+
+        x0.data -= lr * x0.grad
+        x1.data -= lr * x1.grad
+    return i, x0, x1
+
+
+def grad_of(y, xs):
+    # yをxsで微分した値（ndarray）。yがxに依存しない場合は0
+    for x in xs:
+        x.cleargrad()
+    y.backward()
+    return [np.zeros_like(x.data) if x.grad is None else x.grad for x in xs]
+
+
+def newton(tol, max_iters=100):
+    x0 = Variable(np.array(0.0))
+    x1 = Variable(np.array(2.0))
+    xs = [x0, x1]
+    for i in range(max_iters):
+        if converged(x0, x1, tol):
+            break
+        y = rosenbrock(x0, x1)
+        x0.cleargrad()
+        x1.cleargrad()
+        y.backward(create_graph=True)
+        gxs = [x0.grad, x1.grad]  # Variable
+
+        g = np.array([gx.data for gx in gxs])
+        H = np.array([grad_of(gx, xs) for gx in gxs])
+        step = np.linalg.solve(H, g)
+
+        x0.data -= step[0]
+        x1.data -= step[1]
+    return i, x0, x1
+
+
+tol = 1e-4
+for name, method in [('gradient descent', gradient_descent), ('newton', newton)]:
+    start = time.perf_counter()
+    iters, x0, x1 = method(tol)
+    elapsed = time.perf_counter() - start
+    print('{:<17} iters={:>6}  time={:.3f}s  x0={:.6f} x1={:.6f}'.format(
+        name, iters, elapsed, float(x0.data), float(x1.data)))
@@ -0,0 +1,23 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero.utils import numerical_grad, _numerical_grad_loop
+
+# 積み重ねた入力で1回だけfを呼ぶnumerical_gradと、1要素ずつの数値微分の時間を比べる
+# （全てのFunctionの勾配確認は tests/test_gradient_check.py で行う）
+# 要素数が多いと積み重ねた入力が大きくなるので差は縮まる
+
+np.random.seed(0)
+f = lambda x: x ** 3 + 2 * x
+for size in [10, 100, 1000]:
+    x = np.random.rand(size)
+    start = time.perf_counter()
+    g1 = numerical_grad(f, x)
+    t_batched = time.perf_counter() - start
+    start = time.perf_counter()
+    g2 = _numerical_grad_loop(f, x, (), {}, 1e-4)
+    t_loop = time.perf_counter() - start
+    print('numerical_grad {:>5} elements: batched {:>7.2f}ms, loop {:>7.2f}ms, same={}'.format(
+        size, t_batched * 1e3, t_loop * 1e3, np.allclose(g1, g2)))
@@ -0,0 +1,29 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import timeit
+import numpy as np
+from dezero import Variable, Function, no_grad
+from dezero.core_simple import Add, Mul
+
+# 演算1回あたりのオーバーヘッドを、逆伝播あり / なし（no_grad）と定数どうしの演算で比べる
+
+n = 100000
+x = Variable(np.array(1.0))
+y = Variable(np.array(2.0))
+a = np.array(1.0)
+b = np.array(2.0)
+
+
+def per_op(stmt):
+    return min(timeit.repeat(stmt, number=n, repeat=5, globals=globals())) / n * 1e6
+
+
+print('numpy a + b          : {:6.2f}us'.format(per_op('a + b')))
+print('x + y  (grad)        : {:6.2f}us'.format(per_op('x + y')))
+print('x * y  (grad)        : {:6.2f}us'.format(per_op('x * y')))
+with no_grad():
+    print('x + y  (no_grad)     : {:6.2f}us'.format(per_op('x + y')))
+    print('x * y  (no_grad)     : {:6.2f}us'.format(per_op('x * y')))
+print('Add()(a, b) constants: {:6.2f}us'.format(per_op('Add()(a, b)')))
+print('Mul()(a, b) constants: {:6.2f}us'.format(per_op('Mul()(a, b)')))
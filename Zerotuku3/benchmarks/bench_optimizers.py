@@ -0,0 +1,77 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+from dezero import optimizers
+
+# step24 / step28の関数の最小化について、最小値の点（誤差tol以内）に
+# 届くまでの反復回数と時間をoptimizerごとに比べる
+
+
+def sphere(x, y):
+    z = x ** 2 + y ** 2
+    return z
+
+
+def matyas(x, y):
+    z = 0.26 * (x ** 2 + y ** 2) - 0.48 * x * y
+    return z
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def rosenbrock(x0, x1):
+    y = 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return y
+
+
+# (関数, 初期値, 最小値の点, optimizerごとの学習率)
+problems = [
+    (sphere, (1.0, 1.0), (0.0, 0.0), {'SGD': 0.1, 'MomentumSGD': 0.1, 'Adam': 0.1}),
+    (matyas, (1.0, 1.0), (0.0, 0.0), {'SGD': 1.0, 'MomentumSGD': 0.5, 'Adam': 0.1}),
+    (goldstein, (0.2, -0.8), (0.0, -1.0), {'SGD': 1e-5, 'MomentumSGD': 1e-5, 'Adam': 0.01}),
+    (rosenbrock, (0.0, 2.0), (1.0, 1.0), {'SGD': 0.001, 'MomentumSGD': 0.001, 'Adam': 0.1}),
+]
+tol = 1e-4
+max_iters = 50000
+
+
+def run(f, x_init, x_min, optimizer):
+    xs = [Variable(np.array(v)) for v in x_init]
+    optimizer.setup(xs)
+    start = time.perf_counter()
+    for i in range(max_iters):
+        if all(abs(float(x.data) - v) < tol for x, v in zip(xs, x_min)):
+            break
+        if isinstance(optimizer, optimizers.LBFGS):
+            optimizer.update(lambda: f(*xs))
+        else:
+            y = f(*xs)
+            for x in xs:
+                x.cleargrad()
+            y.backward()
+            optimizer.update()
+    else:
+        i = max_iters
+    return i, time.perf_counter() - start
+
+
+print('tol={}  (max {} iterations)'.format(tol, max_iters))
+print('{:>10} {:>12} {:>8} {:>10} {:>10}'.format('func', 'optimizer', 'iters', 'evals', 'time[ms]'))
+for f, x_init, x_min, lrs in problems:
+    cases = [optimizers.SGD(lrs['SGD']),
+             optimizers.MomentumSGD(lrs['MomentumSGD']),
+             optimizers.Adam(lrs['Adam']),
+             optimizers.LBFGS()]
+    for optimizer in cases:
+        iters, elapsed = run(f, x_init, x_min, optimizer)
+        evals = optimizer.n_evals if isinstance(optimizer, optimizers.LBFGS) else iters
+        print('{:>10} {:>12} {:>8} {:>10} {:>10.1f}'.format(
+            f.__name__, type(optimizer).__name__,
+            iters if iters < max_iters else '-', evals, elapsed * 1e3))
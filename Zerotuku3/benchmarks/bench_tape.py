@@ -0,0 +1,42 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+from dezero.tape import trace
+
+# step28のローゼンブロック関数の勾配降下法を、通常の実行（eager）とテープの再生で比べる
+
+
+def rosenbrock(x0, x1):
+    y = 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return y
+
+
+def gradient_descent(f, iters=10000, lr=0.001):
+    x0 = Variable(np.array(0.0))
+    x1 = Variable(np.array(2.0))
+    for i in range(iters):
+        y = f(x0, x1)
+        x0.cleargrad()
+        x1.cleargrad()
+        y.backward()
+
+        x0.data -= lr * x0.grad
+        x1.data -= lr * x1.grad
+    return x0, x1
+
+
+start = time.perf_counter()
+x0, x1 = gradient_descent(rosenbrock)
+t_eager = time.perf_counter() - start
+
+start = time.perf_counter()
+t0, t1 = gradient_descent(trace(rosenbrock))
+t_tape = time.perf_counter() - start
+
+print('eager: {:.3f}s  x0={} x1={}'.format(t_eager, x0.data, x1.data))
+print('tape : {:.3f}s  x0={} x1={}'.format(t_tape, t0.data, t1.data))
+print('speedup: {:.2f}x  same result: {}'.format(
+    t_eager / t_tape, np.allclose(x0.data, t0.data) and np.allclose(x1.data, t1.data)))
@@ -0,0 +1,95 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dezero import Variable, no_grad, Config
+
+# 1. 推論スレッドのno_grad()が学習スレッドの計算グラフ作成に影響しないことを確かめる
+# 2. no_gradの推論をスレッドプールで実行したときのスループット
+
+
+def rosenbrock(x0, x1):
+    y = 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return y
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+# =============================================================================
+# 分離の確認
+# =============================================================================
+iters = 2000
+errors = {'train': 0, 'infer': 0}
+barrier = threading.Barrier(2)
+
+
+def train():
+    x0 = Variable(np.array(0.0))
+    x1 = Variable(np.array(2.0))
+    lr = 0.001
+    for i in range(iters):
+        barrier.wait()  # 推論スレッドがno_gradの中にいるときに計算する
+        y = rosenbrock(x0, x1)
+        if y.creator is None or not Config.enable_backprop:
+            errors['train'] += 1
+            continue
+        x0.grad = None
+        x1.grad = None
+        y.backward()
+        x0.data -= lr * x0.grad
+        x1.data -= lr * x1.grad
+    print('  train: x0={:.4f} x1={:.4f}'.format(float(x0.data), float(x1.data)))
+
+
+def infer():
+    x = Variable(np.random.rand(100) * 0.5)
+    for i in range(iters):
+        with no_grad():
+            barrier.wait()
+            y = goldstein(x, x)
+            if y.creator is not None or Config.enable_backprop:
+                errors['infer'] += 1
+
+
+print('isolation ({} iterations)'.format(iters))
+threads = [threading.Thread(target=train), threading.Thread(target=infer)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print('  errors:', errors, ' main thread enable_backprop:', Config.enable_backprop)
+
+# =============================================================================
+# スループット
+# =============================================================================
+np.random.seed(0)
+batches = [np.random.rand(200000) * 0.5 for _ in range(64)]
+
+
+def predict(a):
+    with no_grad():
+        x = Variable(a)
+        return goldstein(x, x).data.sum()
+
+
+print()
+print('{:>8} {:>10} {:>14} {:>8}'.format('threads', 'time[ms]', 'batches/s', 'scale'))
+base = None
+expected = [predict(a) for a in batches]
+for n in [1, 2, 4, 8]:
+    with ThreadPoolExecutor(n) as pool:
+        list(pool.map(predict, batches[:n]))  # ウォームアップ
+        start = time.perf_counter()
+        results = list(pool.map(predict, batches))
+        elapsed = time.perf_counter() - start
+    assert results == expected
+    rate = len(batches) / elapsed
+    base = base or rate
+    print('{:>8} {:>10.1f} {:>14.1f} {:>7.2f}x'.format(n, elapsed * 1e3, rate, rate / base))
@@ -0,0 +1,50 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import os
+import sys
+import math
+import tempfile
+import numpy as np
+from dezero import Variable, Function
+from dezero.profiler import profile
+
+# step27のテイラー展開によるsin関数をプロファイルする
+# chrome traceは引数のパス（省略した場合は一時ディレクトリ）に書き出す
+
+
+class Sin(Function):
+    def forward(self, x):
+        y = np.sin(x)
+        return y
+
+    def backward(self, gy):
+        x = self.inputs[0].data
+        gx = gy * np.cos(x)
+        return gx
+
+
+def sin(x):
+    return Sin()(x)
+
+
+def my_sin(x, threshold=0.0001):
+    y = 0
+    for i in range(100000):
+        c = (-1) ** i / math.factorial(2 * i + 1)
+        t = c * x ** (2 * i + 1)
+        y = y + t
+        if np.all(abs(t.data) < threshold):
+            break
+    return y
+
+
+x = Variable(np.random.rand(10000))
+with profile() as prof:
+    y = sin(x) + my_sin(x, threshold=1e-150)
+    y.backward()
+
+print(prof.table())
+path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), 'my_sin_trace.json')
+prof.export_chrome_trace(path)
+print('chrome trace:', path)
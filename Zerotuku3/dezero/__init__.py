@@ -6,10 +6,13 @@ is_simple_core = True
 if is_simple_core:
     from dezero.core_simple import Variable
     from dezero.core_simple import Function
+    from dezero.core_simple import Config
     from dezero.core_simple import using_config
     from dezero.core_simple import no_grad
     from dezero.core_simple import as_variable
     from dezero.core_simple import setup_variable
+    from dezero.core_simple import HeapScheduler
+    from dezero.core_simple import SortScheduler
 
 # else:
     # from dezero.core import Variable
@@ -0,0 +1,86 @@
+import contextlib
+from collections import OrderedDict
+import numpy as np
+from dezero.core_simple import Variable, Config, using_config
+
+# =============================================================================
+# 演算結果のキャッシュ（memoization）
+# with memoize() as cache: の中では、pure = Trueの関数の入力
+# （変数はidと版、定数は値）が前回と同じなら、計算せずに前回の出力を返す。
+# 出力から計算グラフ全体を参照するので、maxsizeを超えたら古いものから捨てる
+# =============================================================================
+class FunctionCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # キー -> (入力, 出力, [(出力の版, 計算グラフがあったか)])
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, f, inputs):
+        key = [type(f), f.cache_key(), Config.enable_backprop, Config.dtype]
+        for x in inputs:
+            if isinstance(x, Variable):
+                # 入力はエントリが保持しているので、エントリがある間はidが再利用されない
+                key.append((id(x), x.version))
+            else:
+                x = np.asarray(x)
+                key.append((x.dtype.str, x.shape, x.tobytes()))
+        return tuple(key)
+
+    def valid(self, entry):
+        inputs, outputs, states = entry
+        ys = outputs if isinstance(outputs, list) else [outputs]
+        for y, (version, has_creator) in zip(ys, states):
+            if y.version != version:
+                return False  # 出力のdataが書き換えられた
+            if has_creator and y.creator is None:
+                return False  # backward(retain_graph=False)で計算グラフが解放された
+        return True
+
+    def call(self, f, inputs):
+        key = self.key(f, inputs)
+        entry = self.entries.get(key)
+        if entry is not None and self.valid(entry):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            outputs = entry[1]
+            # 前のbackwardの勾配が残っていると次のbackwardで加算されるので、新しく計算した出力と同じく勾配なしにする
+            for y in (outputs if isinstance(outputs, list) else [outputs]):
+                y.grad = None
+            return list(outputs) if isinstance(outputs, list) else outputs
+
+        self.misses += 1
+        if Config.profiler is not None:
+            outputs = Config.profiler.record_forward(f, inputs)
+        else:
+            outputs = f._call(inputs)
+        ys = outputs if isinstance(outputs, list) else [outputs]
+        self.entries[key] = (inputs, outputs, [(y.version, y.creator is not None) for y in ys])
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return list(outputs) if isinstance(outputs, list) else outputs
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return 'FunctionCache(hits={}, misses={}, hit_rate={:.1%}, size={}/{}, evictions={})'.format(
+            self.hits, self.misses, self.hit_rate, len(self.entries), self.maxsize, self.evictions)
+
+
+@contextlib.contextmanager
+def memoize(maxsize=1024, cache=None):
+    # 同じキャッシュを何度も使う場合は cache=FunctionCache() を渡す
+    if cache is None:
+        cache = FunctionCache(maxsize)
+    with using_config('cache', cache):
+        yield cache
@@ -0,0 +1,80 @@
+import numpy as np
+from dezero.core_simple import Variable, Function, using_config
+
+# =============================================================================
+# Gradient checkpointing
+# forwardでは区間の途中の変数を残さず（計算グラフを作らず）に計算し、
+# backwardのときに区間をもう一度計算して計算グラフを作り直す（計算量とメモリの交換）
+# =============================================================================
+class Checkpoint(Function):
+    __slots__ = ('fn',)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def forward(self, *xs):
+        with using_config('enable_backprop', False):
+            ys = self.fn(*[Variable(x) for x in xs])
+        if not isinstance(ys, tuple):
+            ys = (ys,)
+        return tuple([y.data for y in ys])
+
+    def backward(self, *gys):
+        if any([isinstance(gy, Variable) for gy in gys]):
+            raise NotImplementedError('create_graph is not supported by Checkpoint')
+
+        xs = [Variable(x.data) for x in self.inputs]
+        with using_config('enable_backprop', True):
+            ys = self.fn(*xs)  # 再計算
+        if not isinstance(ys, tuple):
+            ys = (ys,)
+
+        # 出力が複数ある場合も計算グラフは共有されているので、1つの根にまとめて1回だけ逆伝播する
+        # （勾配がNoneの出力と、入力に依存しない出力は除く）
+        pairs = [(y, gy) for y, gy in zip(ys, gys) if gy is not None and y.creator is not None]
+        if pairs:
+            root = _Root([gy for y, gy in pairs])(*[y for y, gy in pairs])
+            root.backward(retain_graph=False)
+
+        # 入力をそのまま返した出力の勾配は、その入力の勾配に足す
+        for y, gy in zip(ys, gys):
+            if gy is not None and any([y is x for x in xs]):
+                y.grad = gy if y.grad is None else y.grad + gy
+
+        gxs = tuple([np.zeros_like(x.data) if x.grad is None else x.grad for x in xs])
+        return gxs if len(gxs) > 1 else gxs[0]
+
+
+class _Root(Function):
+    # 複数の変数の勾配（gys）を、1回のbackwardで流すための根
+    __slots__ = ('gys',)
+
+    def __init__(self, gys):
+        self.gys = gys
+
+    def forward(self, *ys):
+        return np.zeros(())
+
+    def backward(self, gy):
+        return tuple(self.gys)
+
+
+def checkpoint(fn, *args):
+    return Checkpoint(fn)(*args)
+
+
+def checkpoint_sequential(functions, segments, x):
+    # functionsを順に適用する計算を、segments個の区間に分けてそれぞれcheckpointする
+    n = len(functions)
+    size = (n + segments - 1) // segments
+
+    def run(fs):
+        def segment(x):
+            for f in fs:
+                x = f(x)
+            return x
+        return segment
+
+    for start in range(0, n, size):
+        x = checkpoint(run(functions[start:start + size]), x)
+    return x
@@ -1,12 +1,48 @@
 import weakref
+import heapq
+import itertools
 import numpy as np
 import contextlib
+import contextvars
+from dezero import utils
+from dezero import cuda
 
 # =============================================================================
 # Config
+# 値はContextVarに持たせるので、using_configやno_gradの効果はスレッド
+# （asyncioのタスク）ごとに分かれる。設定していないスレッドでは既定値を返す
 # =============================================================================
-class Config:
-    enable_backprop = True
+class _Option:
+    def __init__(self, default):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.var = contextvars.ContextVar(name)
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.var.get(self.default)
+
+    def __set__(self, obj, value):
+        self.var.set(value)
+
+
+class _Config:
+    __slots__ = ()
+    enable_backprop = _Option(True)
+    scheduler = _Option(None)  # 逆伝播のスケジューラ（HeapSchedulerを下で設定）
+    profiler = _Option(None)   # dezero.profiler.profile()の中で設定される
+    dtype = _Option(None)      # np.float32などを設定すると、浮動小数点の変数・定数をその型にそろえる
+    cache = _Option(None)      # dezero.cache.memoize()の中で設定される
+    tracing = _Option(None)    # dezero.tape.Tapeが計算グラフを記録している間に設定される
+
+    def set_default(self, name, value):
+        # すべてのスレッドの既定値を変える
+        type(self).__dict__[name].default = value
+
+
+Config = _Config()
 
 
 @contextlib.contextmanager
@@ -26,19 +62,40 @@ def no_grad():
 # Variable / Function
 # =============================================================================
 class Variable:
+    # __dict__を持たせずにノード1つあたりのメモリと生成コストを抑える
+    # （outputsからweakrefで参照されるので__weakref__は残す）
+    __slots__ = ('_data', '_version', 'name', 'grad', 'creator', 'generation', '__weakref__')
     __array_priority__ = 200
 
     def __init__(self, data, name=None):
         if data is not None:
-            if not isinstance(data, np.ndarray):
+            if not isinstance(data, cuda.array_types):
                 raise TypeError('{} is not supported'.format(type(data)))
+            dtype = Config.dtype
+            if dtype is not None and data.dtype.kind == 'f' and data.dtype != dtype:
+                data = data.astype(dtype)
 
-        self.data = data
+        self._data = data
+        self._version = 0
         self.name = name
         self.grad = None
         self.creator = None
         self.generation = 0
 
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        # dataを入れ替えるたびに版を上げる（dezero.cacheがキーに使う）
+        self._data = value
+        self._version += 1
+
+    @property
+    def version(self):
+        return self._version
+
     @property
     def shape(self):
         return self.data.shape
@@ -71,41 +128,146 @@ class Variable:
     def cleargrad(self):
         self.grad = None
 
-    def backward(self, retain_grad=False):
-        if self.grad is None:
-            self.grad = np.ones_like(self.data)
-
-        funcs = []
-        seen_set = set()
-
-        def add_func(f):
-            if f not in seen_set:
-                funcs.append(f)
-                seen_set.add(f)
-                funcs.sort(key=lambda x: x.generation)
-
-        add_func(self.creator)
+    def backward(self, retain_grad=False, create_graph=False, inplace_grad=False,
+                 retain_graph=True, stats=None):
+        # create_graph=Trueの場合、勾配をVariableとして求め、逆伝播の計算グラフも作る（高階微分用）
+        # retain_graph=Falseの場合、逆伝播が済んだ関数から入出力への参照を外し、
+        # 途中の変数（とそのデータ）をすぐに解放できるようにする（2回目のbackwardはできない）
+        # inplace_grad=Trueの場合、2回目以降の勾配の加算は自分で確保した配列に
+        # インプレースで行う（確保した回数はstatsにBackwardStatsを渡すと確認できる）
+        if stats is None:
+            stats = BackwardStats()
+        inplace_grad = inplace_grad and not create_graph
+        xp = cuda.get_array_module(self.data)
+        if create_graph:
+            if self.grad is None:
+                self.grad = Variable(xp.ones_like(self.data))
+            elif not isinstance(self.grad, Variable):
+                self.grad = Variable(self.grad)
+        elif self.grad is None:
+            self.grad = xp.ones_like(self.data)
+            stats.allocs += 1
+        if self.creator is None:
+            return  # 定数の畳み込みなどで計算グラフを持たない変数は、勾配を設定するだけ
+
+        owned = {}  # id(x) -> このbackwardで確保したx.gradの配列
+        alive = {}  # id(x) -> 生成した関数の逆伝播が済むまで残しておく変数（retain_graph=False用）
+
+        profiler = Config.profiler
+
+        def call_backward(f, gys):
+            if profiler is not None:
+                return profiler.record_backward(f, gys)
+            return f.backward(*gys)
+
+        funcs = Config.scheduler()
+        funcs.push(self.creator)
 
         while funcs:
             f = funcs.pop()
             gys = [output().grad for output in f.outputs]  # output is weakref
-            gxs = f.backward(*gys)
+            if owned:
+                # backwardに渡した勾配は他の変数と共有される可能性があるので、以降は書き換えない
+                for y in f.outputs:
+                    owned.pop(id(y()), None)
+            if create_graph:
+                with using_config('enable_backprop', True):
+                    gxs = call_backward(f, gys)
+            else:
+                gxs = call_backward(f, gys)
             if not isinstance(gxs, tuple):
                 gxs = (gxs,)
 
             for x, gx in zip(f.inputs, gxs):
                 if x.grad is None:
                     x.grad = gx
+                elif inplace_grad and owned.get(id(x)) is x.grad and \
+                        x.grad.shape == xp.shape(gx) and \
+                        x.grad.dtype == xp.result_type(x.grad, gx):
+                    xp.add(x.grad, gx, out=x.grad)
+                    stats.inplace += 1
                 else:
                     x.grad = x.grad + gx
+                    stats.allocs += 1
+                    if inplace_grad:
+                        if not isinstance(x.grad, cuda.array_types):
+                            x.grad = xp.asarray(x.grad)  # 0次元の場合はスカラーになるので配列にする
+                        owned[id(x)] = x.grad
 
                 if x.creator is not None:
-                    add_func(x.creator)
+                    funcs.push(x.creator)
 
             if not retain_grad:
                 for y in f.outputs:
                     y().grad = None  # y is weakref
 
+            if not retain_graph:
+                for x in f.inputs:
+                    if x.creator is not None:
+                        alive[id(x)] = x
+                for y in f.outputs:
+                    y = y()
+                    y.creator = None
+                    alive.pop(id(y), None)
+                f.inputs = None
+                f.outputs = None
+
+
+class BackwardStats:
+    # backwardで勾配用に新しく確保した配列の数と、インプレースで加算した回数
+    # 例: stats = BackwardStats(); y.backward(inplace_grad=True, stats=stats)
+    def __init__(self):
+        self.allocs = 0
+        self.inplace = 0
+
+    def __repr__(self):
+        return 'BackwardStats(allocs={}, inplace={})'.format(self.allocs, self.inplace)
+
+
+# =============================================================================
+# 逆伝播のスケジューラ
+# push(f)で関数を登録し、pop()でgenerationが最大の関数を取り出す
+# =============================================================================
+class HeapScheduler:
+    def __init__(self):
+        self.heap = []
+        self.seen_set = set()
+        self.count = itertools.count()  # 同じgenerationの場合のタイブレーク用
+
+    def push(self, f):
+        if f not in self.seen_set:
+            self.seen_set.add(f)
+            # heapqは最小値を取り出すのでgenerationを負にする
+            heapq.heappush(self.heap, (-f.generation, next(self.count), f))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class SortScheduler:
+    # 以前の実装（追加のたびにリスト全体をソートする）。ベンチマークの比較用
+    def __init__(self):
+        self.funcs = []
+        self.seen_set = set()
+
+    def push(self, f):
+        if f not in self.seen_set:
+            self.funcs.append(f)
+            self.seen_set.add(f)
+            self.funcs.sort(key=lambda x: x.generation)
+
+    def pop(self):
+        return self.funcs.pop()
+
+    def __len__(self):
+        return len(self.funcs)
+
+
+Config.set_default('scheduler', HeapScheduler)
+
 
 def as_variable(obj):
     if isinstance(obj, Variable):
@@ -114,13 +276,32 @@ def as_variable(obj):
 
 
 def as_array(x):
+    if isinstance(x, (np.ndarray, Variable)):  # よくある場合はnp.isscalar（遅い）を呼ばない
+        return x
     if np.isscalar(x):
+        if Config.dtype is not None and isinstance(x, (int, float)) and not isinstance(x, bool):
+            return np.array(x, dtype=Config.dtype)
         return np.array(x)
     return x
 
 
 class Function:
+    __slots__ = ('inputs', 'outputs', 'generation')
+    pure = False  # 同じ入力なら同じ出力になる（dezero.cacheで結果を使い回してよい）
+
     def __call__(self, *inputs):
+        if Config.cache is not None and self.pure:
+            return Config.cache.call(self, inputs)
+        if Config.profiler is not None:
+            return Config.profiler.record_forward(self, inputs)
+        return self._call(inputs)
+
+    def _call(self, inputs):
+        if not Config.enable_backprop or \
+                not any([isinstance(x, Variable) for x in inputs]):
+            return self._call_no_graph(inputs)
+
+        raw_inputs = inputs
         inputs = [as_variable(x) for x in inputs]
 
         xs = [x.data for x in inputs]
@@ -135,25 +316,56 @@ class Function:
                 output.set_creator(self)
             self.inputs = inputs
             self.outputs = [weakref.ref(output) for output in outputs]
+            if Config.tracing is not None:
+                Config.tracing.add(self, raw_inputs, inputs)
 
         return outputs if len(outputs) > 1 else outputs[0]
 
+    def _call_no_graph(self, inputs):
+        # 逆伝播しない場合や、入力に変数がない（定数だけの）場合は計算グラフを作らない
+        xs = [x.data if isinstance(x, Variable) else x for x in inputs]
+        ys = self.forward(*xs)
+        if not isinstance(ys, tuple):
+            ys = (ys,)
+        outputs = [Variable(as_array(y)) for y in ys]
+        if Config.tracing is not None:
+            Config.tracing.add_constants(outputs)
+        return outputs if len(outputs) > 1 else outputs[0]
+
+    def cache_key(self):
+        # 入力以外で出力を決めるパラメータ（Powの指数など）
+        return ()
+
     def forward(self, xs):
         raise NotImplementedError()
 
     def backward(self, gys):
         raise NotImplementedError()
 
+    def _backward_inputs(self, gy):
+        # create_graph=True（gyがVariable）の場合は入力もVariableのまま使って計算グラフを作る
+        if isinstance(gy, Variable):
+            return self.inputs
+        return [x.data for x in self.inputs]
+
 # =============================================================================
 # 四則演算 / 演算子のオーバーロード
 # =============================================================================
 class Add(Function):
+    __slots__ = ()
+    pure = True
+
     def forward(self, x0, x1):
         y = x0 + x1
         return y
 
     def backward(self, gy):
-        return gy, gy
+        gx0, gx1 = gy, gy
+        x0, x1 = self.inputs
+        if x0.shape != x1.shape:  # ブロードキャストした場合は和をとって元の形に戻す
+            gx0 = sum_to(gx0, x0.shape)
+            gx1 = sum_to(gx1, x1.shape)
+        return gx0, gx1
 
 
 def add(x0, x1):
@@ -162,13 +374,21 @@ def add(x0, x1):
 
 
 class Mul(Function):
+    __slots__ = ()
+    pure = True
+
     def forward(self, x0, x1):
         y = x0 * x1
         return y
 
     def backward(self, gy):
-        x0, x1 = self.inputs[0].data, self.inputs[1].data
-        return gy * x1, gy * x0
+        x0, x1 = self._backward_inputs(gy)
+        gx0 = gy * x1
+        gx1 = gy * x0
+        if x0.shape != x1.shape:
+            gx0 = sum_to(gx0, x0.shape)
+            gx1 = sum_to(gx1, x1.shape)
+        return gx0, gx1
 
 
 def mul(x0, x1):
@@ -177,6 +397,9 @@ def mul(x0, x1):
 
 
 class Neg(Function):
+    __slots__ = ()
+    pure = True
+
     def forward(self, x):
         return -x
 
@@ -189,12 +412,21 @@ def neg(x):
 
 
 class Sub(Function):
+    __slots__ = ()
+    pure = True
+
     def forward(self, x0, x1):
         y = x0 - x1
         return y
 
     def backward(self, gy):
-        return gy, -gy
+        gx0 = gy
+        gx1 = -gy
+        x0, x1 = self.inputs
+        if x0.shape != x1.shape:
+            gx0 = sum_to(gx0, x0.shape)
+            gx1 = sum_to(gx1, x1.shape)
+        return gx0, gx1
 
 
 def sub(x0, x1):
@@ -208,14 +440,20 @@ def rsub(x0, x1):
 
 
 class Div(Function):
+    __slots__ = ()
+    pure = True
+
     def forward(self, x0, x1):
         y = x0 / x1
         return y
 
     def backward(self, gy):
-        x0, x1 = self.inputs[0].data, self.inputs[1].data
+        x0, x1 = self._backward_inputs(gy)
         gx0 = gy / x1
         gx1 = gy * (-x0 / x1 ** 2)
+        if x0.shape != x1.shape:
+            gx0 = sum_to(gx0, x0.shape)
+            gx1 = sum_to(gx1, x1.shape)
         return gx0, gx1
 
 
@@ -230,15 +468,22 @@ def rdiv(x0, x1):
 
 
 class Pow(Function):
+    __slots__ = ('c',)
+
+    pure = True
+
     def __init__(self, c):
         self.c = c
 
+    def cache_key(self):
+        return (self.c,)
+
     def forward(self, x):
         y = x ** self.c
         return y
 
     def backward(self, gy):
-        x = self.inputs[0].data
+        x, = self._backward_inputs(gy)
         c = self.c
 
         gx = c * x ** (c - 1) * gy
@@ -248,6 +493,65 @@ class Pow(Function):
 def pow(x, c):
     return Pow(c)(x)
 
+# =============================================================================
+# ブロードキャスト（二項演算の逆伝播で使う）
+# =============================================================================
+class SumTo(Function):
+    __slots__ = ('shape', 'x_shape')
+    pure = True
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def cache_key(self):
+        return (self.shape,)
+
+    def forward(self, x):
+        self.x_shape = x.shape
+        y = utils.sum_to(x, self.shape)
+        return y
+
+    def backward(self, gy):
+        gx = broadcast_to(gy, self.x_shape)
+        return gx
+
+
+def sum_to(x, shape):
+    if not isinstance(x, Variable):
+        return utils.sum_to(x, shape)
+    if x.shape == shape:
+        return x
+    return SumTo(shape)(x)
+
+
+class BroadcastTo(Function):
+    __slots__ = ('shape', 'x_shape')
+    pure = True
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def cache_key(self):
+        return (self.shape,)
+
+    def forward(self, x):
+        self.x_shape = x.shape
+        y = np.broadcast_to(x, self.shape)
+        return y
+
+    def backward(self, gy):
+        gx = sum_to(gy, self.x_shape)
+        return gx
+
+
+def broadcast_to(x, shape):
+    if not isinstance(x, Variable):
+        return np.broadcast_to(x, shape)
+    if x.shape == shape:
+        return x
+    return BroadcastTo(shape)(x)
+
+
 def setup_variable():
     Variable.__add__ = add
     Variable.__radd__ = add
@@ -0,0 +1,44 @@
+import numpy as np
+
+# =============================================================================
+# 配列のバックエンド（NumPy / CuPy など）
+# Variableが扱える配列の型と、その型に対応するモジュール（xp）を登録しておき、
+# get_array_module(x)でxに合ったモジュールを返す
+# =============================================================================
+_backends = []  # (配列の型, モジュール)
+array_types = (np.ndarray,)
+
+
+def register_backend(array_type, xp):
+    global array_types
+    _backends.append((array_type, xp))
+    array_types = array_types + (array_type,)
+
+
+def get_array_module(x):
+    for array_type, xp in _backends:
+        if isinstance(x, array_type):
+            return xp
+    return np
+
+
+gpu_enable = True
+try:
+    import cupy as cp
+    register_backend(cp.ndarray, cp)
+except ImportError:
+    gpu_enable = False
+
+
+def as_numpy(x):
+    if np.isscalar(x):
+        return np.array(x)
+    elif isinstance(x, np.ndarray):
+        return x
+    return cp.asnumpy(x)
+
+
+def as_cupy(x):
+    if not gpu_enable:
+        raise Exception('CuPy cannot be loaded. Install CuPy!')
+    return cp.asarray(x)
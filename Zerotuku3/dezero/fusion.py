@@ -0,0 +1,195 @@
+import numpy as np
+from dezero import cuda
+from dezero.core_simple import Variable, Function, Add, Sub, Mul, Div, Neg, Pow
+from dezero.tape import Tape, TapeFunction
+from dezero.utils import sum_to
+
+# =============================================================================
+# 要素ごとの演算の融合（fusion）
+# Add / Mul / Sub / Div / Neg / Powだけでできた計算グラフを1つのFusedFunctionにまとめる。
+# forwardはout=で確保済みの配列に書き込み、使い終わった一時配列は使い回す。
+# backwardも関数ごとのノードを作らずに、まとめて計算する
+# =============================================================================
+_ELEMENTWISE = {Add: 'add', Sub: 'sub', Mul: 'mul', Div: 'div', Neg: 'neg', Pow: 'pow'}
+_SAVE_INPUTS = {'mul', 'div', 'pow'}  # backwardで入力の値が必要な演算
+
+
+def _forward_kernel(op, xs, c, out):
+    if op == 'add':
+        return np.add(xs[0], xs[1], out=out)
+    if op == 'sub':
+        return np.subtract(xs[0], xs[1], out=out)
+    if op == 'mul':
+        return np.multiply(xs[0], xs[1], out=out)
+    if op == 'div':
+        return np.divide(xs[0], xs[1], out=out)
+    if op == 'neg':
+        return np.negative(xs[0], out=out)
+    if c == 2:
+        return np.square(xs[0], out=out)
+    return np.power(xs[0], c, out=out)
+
+
+def _backward_kernel(op, xs, c, gy, needs):
+    # needs[i]がFalseの入力（定数など）の勾配は計算しない
+    if op == 'add':
+        return gy, gy
+    if op == 'sub':
+        return gy, (-gy if needs[1] else None)
+    if op == 'mul':
+        x0, x1 = xs
+        return (gy * x1 if needs[0] else None), (gy * x0 if needs[1] else None)
+    if op == 'div':
+        x0, x1 = xs
+        gx0 = gy / x1 if needs[0] else None
+        gx1 = gy * (-x0 / x1 ** 2) if needs[1] else None
+        return gx0, gx1
+    if op == 'neg':
+        return (-gy,)
+    x, = xs
+    return (c * x ** (c - 1) * gy,)
+
+
+class Program:
+    def __init__(self, trace):
+        self.n_slots = trace.n_slots
+        self.input_slots = trace.input_slots
+        self.output_slots = trace.output_slots
+        self.captured = trace.captured
+        self.captured_sig = trace.captured_sig
+
+        shapes = {}
+        dtypes = {}
+        for x, i in zip(trace.inputs, self.input_slots):
+            shapes[i] = x.shape
+            dtypes[i] = x.dtype
+        consts = {}
+        self.code = []
+        for f, ys, in_slots, out_slots in trace.ops:
+            op = _ELEMENTWISE[type(f)]
+            c = f.c if op == 'pow' else None
+            out, = out_slots
+            for x, i in zip(f.inputs, in_slots):
+                if i not in shapes:  # 入力でも途中の変数でもないものは定数
+                    shapes[i] = x.shape
+                    dtypes[i] = x.dtype
+                    consts[i] = x.data
+            shapes[out] = ys[0].shape
+            dtypes[out] = ys[0].dtype
+            self.code.append((op, in_slots, out, c))
+        produced = set(out for op, in_slots, out, c in self.code)
+        self.shapes = shapes
+        self.dtypes = dtypes
+        self.consts = consts
+        self.n_funcs = len(self.code)
+
+        # 勾配が必要な変数（入力から計算される変数）
+        needs_grad = [False] * self.n_slots
+        for i in self.input_slots:
+            needs_grad[i] = True
+        for op, in_slots, out, c in self.code:
+            needs_grad[out] = any(needs_grad[i] for i in in_slots)
+        self.needs_grad = needs_grad
+
+        # backwardまで値を残しておく変数と、forwardで最後に使われる位置
+        keep = set(self.output_slots)
+        last_use = {}
+        for k, (op, in_slots, out, c) in enumerate(self.code):
+            if op in _SAVE_INPUTS and needs_grad[out]:
+                keep.update(in_slots)
+            for i in in_slots:
+                last_use[i] = k
+        self.release = [[i for i in set(in_slots)
+                         if i in produced and i not in keep and last_use[i] == k]
+                        for k, (op, in_slots, out, c) in enumerate(self.code)]
+
+    def forward(self, xs):
+        values = [None] * self.n_slots
+        for i, x in zip(self.input_slots, xs):
+            values[i] = x
+        for i, x in self.consts.items():
+            values[i] = x
+
+        xp = cuda.get_array_module(xs[0])
+        free = {}  # (shape, dtype) -> 使い終わった一時配列
+        for (op, in_slots, out, c), release in zip(self.code, self.release):
+            key = (self.shapes[out], self.dtypes[out])
+            bufs = free.get(key)
+            buf = bufs.pop() if bufs else xp.empty(*key)
+            values[out] = _forward_kernel(op, [values[i] for i in in_slots], c, buf)
+            for i in release:
+                free.setdefault((self.shapes[i], self.dtypes[i]), []).append(values[i])
+                values[i] = None
+        return tuple(values[i] for i in self.output_slots), values
+
+    def backward(self, values, gys):
+        xp = cuda.get_array_module(gys[0])
+        grads = [None] * self.n_slots
+        owned = set()  # インプレースで加算してよい（このbackwardで確保した）勾配
+
+        def accumulate(i, g):
+            if g.shape != self.shapes[i]:
+                g = sum_to(g, self.shapes[i])
+            if grads[i] is None:
+                grads[i] = g
+            elif i in owned:
+                grads[i] += g
+            else:
+                grads[i] = grads[i] + g
+                owned.add(i)
+
+        for i, gy in zip(self.output_slots, gys):
+            accumulate(i, xp.asarray(gy))
+
+        needs_grad = self.needs_grad
+        for op, in_slots, out, c in reversed(self.code):
+            gy = grads[out]
+            if gy is None or not needs_grad[out]:
+                continue
+            needs = [needs_grad[i] for i in in_slots]
+            gxs = _backward_kernel(op, [values[i] for i in in_slots], c, gy, needs)
+            owned.discard(out)
+            for i, gx, need in zip(in_slots, gxs, needs):
+                if need:
+                    accumulate(i, xp.asarray(gx))
+
+        return tuple(xp.zeros(self.shapes[i], self.dtypes[i]) if grads[i] is None else grads[i]
+                     for i in self.input_slots)
+
+
+class FusedFunction(Function):
+    __slots__ = ('program', 'values')
+
+    def __init__(self, program):
+        self.program = program
+
+    def forward(self, *xs):
+        ys, self.values = self.program.forward(xs)
+        return ys
+
+    def backward(self, *gys):
+        if any([isinstance(gy, Variable) for gy in gys]):
+            raise NotImplementedError('create_graph is not supported by FusedFunction')
+        return self.program.backward(self.values, gys)
+
+
+class Fusion(Tape):
+    def record(self, args):
+        trace = super().record(args)
+        if trace is None:
+            return None
+        if all(type(f) in _ELEMENTWISE for f, ys, in_slots, out_slots in trace.ops):
+            return Program(trace)
+        # 要素ごとの演算以外を含む場合は融合せずにテープの再生にする
+        return trace
+
+    def function(self, program):
+        if isinstance(program, Program):
+            return FusedFunction(program)
+        return TapeFunction(program)
+
+
+def fuse(fn=None, key=None, max_traces=8):
+    if fn is None:
+        return lambda fn: Fusion(fn, key, max_traces)
+    return Fusion(fn, key, max_traces)
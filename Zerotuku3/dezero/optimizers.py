@@ -0,0 +1,203 @@
+import numpy as np
+from dezero import cuda
+
+# =============================================================================
+# Optimizer（基底クラス）
+# 最適化する変数のリストをsetupで渡し、backwardの後でupdateを呼ぶ。
+# 更新はparam.dataの配列をその場で書き換える（param.data -= ... なので変数の版も上がる）
+# =============================================================================
+class Optimizer:
+    def __init__(self):
+        self.target = None
+        self.hooks = []
+
+    def setup(self, target):
+        self.target = list(target)
+        return self
+
+    def update(self):
+        params = [p for p in self.target if p.grad is not None]
+
+        # 前処理（勾配クリッピングなど）
+        for f in self.hooks:
+            f(params)
+
+        for param in params:
+            self.update_one(param)
+
+    def update_one(self, param):
+        raise NotImplementedError()
+
+    def add_hook(self, f):
+        self.hooks.append(f)
+
+
+# =============================================================================
+# SGD / MomentumSGD / Adam
+# =============================================================================
+class SGD(Optimizer):
+    def __init__(self, lr=0.01):
+        super().__init__()
+        self.lr = lr
+
+    def update_one(self, param):
+        param.data -= self.lr * param.grad
+
+
+class MomentumSGD(Optimizer):
+    def __init__(self, lr=0.01, momentum=0.9):
+        super().__init__()
+        self.lr = lr
+        self.momentum = momentum
+        self.vs = {}
+
+    def update_one(self, param):
+        key = id(param)
+        v = self.vs.get(key)
+        if v is None:
+            xp = cuda.get_array_module(param.data)
+            v = self.vs[key] = xp.zeros_like(param.data)
+
+        v *= self.momentum
+        v -= self.lr * param.grad
+        param.data += v
+
+
+class Adam(Optimizer):
+    def __init__(self, alpha=0.001, beta1=0.9, beta2=0.999, eps=1e-8):
+        super().__init__()
+        self.t = 0
+        self.alpha = alpha
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.ms = {}
+        self.vs = {}
+        self.bufs = {}
+
+    def update(self, *args, **kwargs):
+        self.t += 1
+        super().update(*args, **kwargs)
+
+    @property
+    def lr(self):
+        fix1 = 1. - np.power(self.beta1, self.t)
+        fix2 = 1. - np.power(self.beta2, self.t)
+        return self.alpha * np.sqrt(fix2) / fix1
+
+    def update_one(self, param):
+        xp = cuda.get_array_module(param.data)
+        key = id(param)
+        if key not in self.ms:
+            self.ms[key] = xp.zeros_like(param.data)
+            self.vs[key] = xp.zeros_like(param.data)
+            self.bufs[key] = xp.empty_like(param.data)
+
+        m, v, step = self.ms[key], self.vs[key], self.bufs[key]
+        grad = param.grad
+        m += (1 - self.beta1) * (grad - m)
+        v += (1 - self.beta2) * (grad * grad - v)
+
+        # 更新量は確保済みの配列にout=で計算する
+        xp.sqrt(v, out=step)
+        step += self.eps
+        xp.divide(m, step, out=step)
+        step *= self.lr
+        param.data -= step
+
+# =============================================================================
+# L-BFGS（直線探索つき）
+# 損失を何度も計算し直すので、updateには損失（Variable）を返す関数を渡す。
+# 勾配は過去history_size回分の (s, y) から2重ループで近似ヘッセ行列の逆行列をかけて求め、
+# ステップ幅はArmijo条件を満たすまで半分にする（バックトラッキング）
+# =============================================================================
+class LBFGS(Optimizer):
+    def __init__(self, lr=1.0, history_size=10, c1=1e-4, max_ls=30):
+        super().__init__()
+        self.lr = lr
+        self.history_size = history_size
+        self.c1 = c1
+        self.max_ls = max_ls
+        self.ss = []
+        self.ys = []
+        self.loss = None
+        self.flat_grad = None
+        self.n_evals = 0
+
+    def _get_flat(self):
+        return np.concatenate([np.ravel(p.data) for p in self.target])
+
+    def _set_flat(self, flat):
+        offset = 0
+        for p in self.target:
+            size = p.data.size
+            data = p.data
+            data[...] = flat[offset:offset + size].reshape(data.shape)
+            p.data = data  # 版を上げる
+            offset += size
+
+    def _evaluate(self, closure):
+        for p in self.target:
+            p.cleargrad()
+        loss = closure()
+        loss.backward()
+        self.n_evals += 1
+        grads = [np.zeros(p.data.size) if p.grad is None else np.ravel(p.grad)
+                 for p in self.target]
+        return float(loss.data), np.concatenate(grads)
+
+    def _direction(self, g):
+        # 2重ループ（two-loop recursion）
+        q = -g
+        alphas = []
+        for s, y in zip(reversed(self.ss), reversed(self.ys)):
+            alpha = np.dot(s, q) / np.dot(y, s)
+            q -= alpha * y
+            alphas.append(alpha)
+        if self.ss:
+            s, y = self.ss[-1], self.ys[-1]
+            q *= np.dot(s, y) / np.dot(y, y)
+        else:
+            q /= max(1.0, np.sum(np.abs(g)))  # 最初は勾配の大きさで正規化
+        for (s, y), alpha in zip(zip(self.ss, self.ys), reversed(alphas)):
+            beta = np.dot(y, q) / np.dot(y, s)
+            q += (alpha - beta) * s
+        return q
+
+    def update(self, closure):
+        # パラメータやデータが前回のupdateの後に変わっているかもしれないので、毎回計算し直す
+        loss, g = self._evaluate(closure)
+
+        d = self._direction(g)
+        gd = np.dot(g, d)
+        if gd >= 0:  # 下降方向でなくなったら履歴を捨てて最急降下法に戻す
+            self.ss, self.ys = [], []
+            d = self._direction(g)
+            gd = np.dot(g, d)
+
+        x = self._get_flat()
+        t = self.lr
+        for _ in range(self.max_ls):
+            self._set_flat(x + t * d)
+            new_loss, new_g = self._evaluate(closure)
+            if new_loss <= loss + self.c1 * t * gd:
+                break
+            t *= 0.5
+        else:
+            # 直線探索に失敗した場合は元の点に戻し、(s, y)は記録しない。
+            # 同じ方向で失敗し続けないように履歴も捨てる
+            self._set_flat(x)
+            self.ss, self.ys = [], []
+            self.loss, self.flat_grad = loss, g
+            return loss
+
+        s = self._get_flat() - x  # 実際に動いた量（パラメータの型に丸めた後）
+        y = new_g - g
+        if np.dot(y, s) > 1e-10:  # 曲率条件を満たす組だけ残す
+            self.ss.append(s)
+            self.ys.append(y)
+            if len(self.ss) > self.history_size:
+                self.ss.pop(0)
+                self.ys.pop(0)
+        self.loss, self.flat_grad = new_loss, new_g
+        return new_loss
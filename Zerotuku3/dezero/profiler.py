@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from dezero.core_simple import using_config
+
+# =============================================================================
+# Profiler
+# with profile() as prof: の中で、Function.__call__（forward）と
+# Variable.backward内の関数ごとのbackwardの時間・回数・確保したバイト数を記録する
+# =============================================================================
+class FunctionStats:
+    __slots__ = ('calls', 'forward_time', 'forward_bytes',
+                 'backward_calls', 'backward_time', 'backward_bytes', 'max_depth')
+
+    def __init__(self):
+        self.calls = 0
+        self.forward_time = 0.0
+        self.forward_bytes = 0
+        self.backward_calls = 0
+        self.backward_time = 0.0
+        self.backward_bytes = 0
+        self.max_depth = 0  # 出力変数のgenerationの最大値（計算グラフの深さ）
+
+
+def _nbytes(xs):
+    # Addのように同じ配列を複数返す場合は1回だけ数える
+    unique = {id(x): x for x in xs}
+    return sum([getattr(x, 'nbytes', 0) for x in unique.values()])
+
+
+class Profiler:
+    def __init__(self, trace=True):
+        self.stats = {}
+        self.trace = trace  # Chrome trace用のイベントを記録するかどうか
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def _stats(self, f):
+        name = f.__class__.__name__
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = FunctionStats()
+        return stats
+
+    def _event(self, f, cat, start, end, nbytes, depth):
+        self.events.append({
+            'name': f.__class__.__name__, 'cat': cat, 'ph': 'X',
+            'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+            'args': {'bytes': nbytes, 'depth': depth}})
+
+    def record_forward(self, f, inputs):
+        start = time.perf_counter()
+        outputs = f._call(inputs)
+        end = time.perf_counter()
+
+        ys = outputs if isinstance(outputs, list) else [outputs]
+        nbytes = _nbytes([y.data for y in ys])
+        depth = max([y.generation for y in ys])
+        stats = self._stats(f)
+        stats.calls += 1
+        stats.forward_time += end - start
+        stats.forward_bytes += nbytes
+        stats.max_depth = max(stats.max_depth, depth)
+        if self.trace:
+            self._event(f, 'forward', start, end, nbytes, depth)
+        return outputs
+
+    def record_backward(self, f, gys):
+        start = time.perf_counter()
+        gxs = f.backward(*gys)
+        end = time.perf_counter()
+
+        nbytes = _nbytes(gxs if isinstance(gxs, tuple) else (gxs,))
+        stats = self._stats(f)
+        stats.backward_calls += 1
+        stats.backward_time += end - start
+        stats.backward_bytes += nbytes
+        if self.trace:
+            self._event(f, 'backward', start, end, nbytes, f.generation)
+        return gxs
+
+    def table(self, sort_by='total'):
+        keys = {
+            'total': lambda item: item[1].forward_time + item[1].backward_time,
+            'forward': lambda item: item[1].forward_time,
+            'backward': lambda item: item[1].backward_time,
+            'calls': lambda item: item[1].calls,
+        }
+        rows = sorted(self.stats.items(), key=keys[sort_by], reverse=True)
+
+        header = '{:<16} {:>8} {:>10} {:>12} {:>8} {:>10} {:>12} {:>6}'
+        row = '{:<16} {:>8} {:>10.3f} {:>12} {:>8} {:>10.3f} {:>12} {:>6}'
+        lines = [header.format('function', 'calls', 'fwd[ms]', 'fwd bytes',
+                               'bwd', 'bwd[ms]', 'bwd bytes', 'depth')]
+        for name, s in rows:
+            lines.append(row.format(name, s.calls, s.forward_time * 1e3, s.forward_bytes,
+                                    s.backward_calls, s.backward_time * 1e3,
+                                    s.backward_bytes, s.max_depth))
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path):
+        # chrome://tracing や Perfetto で開ける形式
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+@contextlib.contextmanager
+def profile(trace=True):
+    prof = Profiler(trace)
+    with using_config('profiler', prof):
+        yield prof
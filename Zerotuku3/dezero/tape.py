@@ -0,0 +1,261 @@
+import numpy as np
+from dezero import cuda
+from dezero.core_simple import Variable, Function, using_config, as_array, as_variable
+
+# =============================================================================
+# テープ（trace once, replay many）
+# 同じ形の計算グラフを何度も作り直す代わりに、1回目の計算グラフから
+# forward / backwardの呼び出し順を平坦なリスト（テープ）として記録し、
+# 2回目以降はNumPyの計算だけを再生する
+# =============================================================================
+class _Recorder:
+    # 記録中に呼ばれた関数と、関数の中で作られた定数の変数を集める
+    # 入力の値から（Functionを通さずに）計算した定数はテープに焼き込まれてしまうので、
+    # 値が使われたものとして扱う（例: x * np.exp(x.data)）
+    def __init__(self):
+        self.funcs = set()
+        self.consts = {}  # id -> 変数（idが再利用されないように保持する）
+
+    def add(self, f, raw_inputs, inputs):
+        self.funcs.add(f)
+        for raw, x in zip(raw_inputs, inputs):
+            if raw is not x:  # ndarrayなどから作った変数
+                self._add_constant(x)
+
+    def add_constants(self, outputs):
+        for y in outputs:
+            self._add_constant(y)
+
+    def _add_constant(self, x):
+        if isinstance(x.data, _Probe):
+            x.data._use()
+        self.consts[id(x)] = x
+
+
+class _Probe(np.ndarray):
+    # 記録中の値がPythonの制御フロー（if、float()など）に使われたかを調べる配列
+    def __array_finalize__(self, obj):
+        self.used = getattr(obj, 'used', None)
+
+    def __array_wrap__(self, arr, context=None, return_scalar=False):
+        # np.allなどの結果も、スカラーにせず_Probeのまま返す
+        return super().__array_wrap__(arr, context)
+
+    def _use(self):
+        if self.used is not None:
+            self.used.append(True)
+
+    def __bool__(self):
+        self._use()
+        return super().__bool__()
+
+    def __float__(self):
+        self._use()
+        return super().__float__()
+
+    def __int__(self):
+        self._use()
+        return super().__int__()
+
+    def __index__(self):
+        self._use()
+        return super().__index__()
+
+    def __getitem__(self, key):
+        # x.data[0]などは（0次元配列ではなく）NumPyのスカラーになるので、ここで調べる
+        y = super().__getitem__(key)
+        if not isinstance(y, np.ndarray):
+            self._use()
+        return y
+
+    def __iter__(self):
+        if self.ndim == 1:
+            self._use()
+        return super().__iter__()
+
+    def item(self, *args):
+        self._use()
+        return super().item(*args)
+
+    def tolist(self):
+        self._use()
+        return super().tolist()
+
+
+class Trace:
+    def __init__(self, inputs, outputs, recorder):
+        funcs = []
+        seen_set = set()
+        stack = [y.creator for y in outputs if y.creator in recorder.funcs]
+        while stack:
+            f = stack.pop()
+            if f in seen_set:
+                continue
+            seen_set.add(f)
+            funcs.append(f)
+            for x in f.inputs:
+                # 記録より前に作られた計算グラフ（クロージャの変数の祖先）はたどらない
+                if x.creator in recorder.funcs:
+                    stack.append(x.creator)
+        # 入力のgenerationは出力より必ず小さいので、generation順に並べれば実行順になる
+        funcs.sort(key=lambda f: f.generation)
+
+        slots = {}
+
+        def slot(v):
+            if id(v) not in slots:
+                slots[id(v)] = len(slots)
+            return slots[id(v)]
+
+        # 引数でも、記録中の関数の出力や定数でもない変数は、クロージャなどで
+        # 参照している外の変数。暗黙の入力として値を読み、勾配も返す
+        placeholders = set(id(x) for x in inputs)
+        captured = {}
+        for f in funcs:
+            for x in f.inputs:
+                if id(x) not in placeholders and id(x) not in recorder.consts and \
+                        x.creator not in seen_set:
+                    captured[id(x)] = x
+        self.captured = list(captured.values())
+        self.captured_sig = [(x.shape, x.dtype) for x in self.captured]
+
+        self.inputs = list(inputs) + self.captured
+        self.outputs = outputs
+        self.input_slots = [slot(x) for x in self.inputs]
+        self.output_slots = [slot(y) for y in outputs]
+        self.ops = []
+        for f in funcs:
+            # 途中の変数はweakrefでしか参照されていないので、テープで保持しておく
+            ys = [output() for output in f.outputs]
+            in_slots = [slot(x) for x in f.inputs]
+            out_slots = [slot(y) if y is not None else None for y in ys]
+            self.ops.append((f, ys, in_slots, out_slots))
+        self.n_slots = len(slots)
+        self.owner = None  # 最後にforwardを実行したTapeFunction
+
+    def forward(self, xs):
+        for x, data in zip(self.inputs, xs):
+            if x.data is not data:  # クロージャの変数は同じ配列なので、版を上げない
+                x.data = data
+        for f, ys, in_slots, out_slots in self.ops:
+            # backwardがself.inputs[i].dataを参照するので、値は変数に書き戻す
+            outs = f.forward(*[x.data for x in f.inputs])
+            if not isinstance(outs, tuple):
+                outs = (outs,)
+            for y, out in zip(ys, outs):
+                if y is not None:
+                    # 0次元配列同士の演算はスカラーを返すので配列に戻す
+                    y.data = out if isinstance(out, cuda.array_types) else np.asarray(out)
+        return tuple(y.data for y in self.outputs)
+
+    def backward(self, gys):
+        grads = [None] * self.n_slots
+        for i, gy in zip(self.output_slots, gys):
+            grads[i] = gy if grads[i] is None else grads[i] + gy
+
+        for f, ys, in_slots, out_slots in reversed(self.ops):
+            if len(out_slots) == 1:
+                gy = grads[out_slots[0]]
+                if gy is None:
+                    continue  # 出力に影響しない関数
+                gxs = f.backward(gy)
+            else:
+                gs = [grads[i] if i is not None else None for i in out_slots]
+                if all(g is None for g in gs):
+                    continue
+                gs = [np.zeros_like(y.data) if g is None else g for y, g in zip(ys, gs)]
+                gxs = f.backward(*gs)
+            if not isinstance(gxs, tuple):
+                gxs = (gxs,)
+            for i, gx in zip(in_slots, gxs):
+                g = grads[i]
+                grads[i] = gx if g is None else g + gx
+
+        return tuple(np.zeros_like(x.data) if grads[i] is None else grads[i]
+                     for x, i in zip(self.inputs, self.input_slots))
+
+
+class TapeFunction(Function):
+    # テープ全体を1つの関数として計算グラフにつなぐ
+    __slots__ = ('trace',)
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def forward(self, *xs):
+        self.trace.owner = self
+        return self.trace.forward(xs)
+
+    def backward(self, *gys):
+        if any([isinstance(gy, Variable) for gy in gys]):
+            raise NotImplementedError('create_graph is not supported by TapeFunction')
+        trace = self.trace
+        if trace.owner is not self:
+            # 別の呼び出しでテープの値が上書きされているので、forwardをやり直す
+            trace.forward([x.data for x in self.inputs])
+            trace.owner = self
+        return trace.backward(gys)
+
+
+class Tape:
+    def __init__(self, fn, key=None, max_traces=8):
+        self.fn = fn
+        self.key = key  # 制御フローを決める値を返す関数（例: lambda x: threshold）
+        self.max_traces = max_traces
+        self.traces = {}
+
+    def signature(self, args):
+        sig = tuple((x.shape, x.dtype) for x in args)
+        if self.key is not None:
+            sig += (self.key(*args),)
+        return sig
+
+    def record(self, args):
+        # 値が制御フローに使われたら、テープは入力の値によって変わりうるので記録しない
+        # （keyを渡した場合は、制御フローはkeyで区別できるものとする）
+        used = []
+        placeholders = []
+        for x in args:
+            data = x.data
+            if self.key is None and type(data) is np.ndarray:
+                data = data.view(_Probe)
+                data.used = used
+            placeholders.append(Variable(data))
+
+        recorder = _Recorder()
+        with using_config('enable_backprop', True), using_config('tracing', recorder):
+            outputs = self.fn(*placeholders)
+        if used:
+            return None
+        if not isinstance(outputs, tuple):
+            outputs = (outputs,)
+        return Trace(placeholders, [as_variable(y) for y in outputs], recorder)
+
+    def __call__(self, *args):
+        args = [as_variable(as_array(x)) for x in args]
+        sig = self.signature(args)
+
+        if sig in self.traces:
+            trace = self.traces[sig]
+        elif len(self.traces) >= self.max_traces:
+            # 形や制御フローが毎回変わる場合は通常どおり（eager）に計算する
+            return self.fn(*args)
+        else:
+            trace = self.traces[sig] = self.record(args)
+
+        if trace is not None and \
+                [(x.shape, x.dtype) for x in trace.captured] != trace.captured_sig:
+            trace = self.traces[sig] = self.record(args)  # クロージャの変数の形が変わった
+        if trace is None:
+            return self.fn(*args)  # 値によって制御フローが変わる関数
+        return self.function(trace)(*args, *trace.captured)
+
+    def function(self, trace):
+        return TapeFunction(trace)
+
+
+def trace(fn=None, key=None, max_traces=8):
+    # @traceでも@trace(key=...)でも使えるようにする
+    if fn is None:
+        return lambda fn: Tape(fn, key, max_traces)
+    return Tape(fn, key, max_traces)
@@ -1,5 +1,17 @@
 import os
+import html
+import json
+import queue
+import atexit
+import shutil
+import tempfile
+import warnings
+import threading
 import subprocess
+import collections
+import functools
+import concurrent.futures
+import numpy as np
 
 def _dot_var(v, verbose=False):
     dot_var = '{}[label="{}", color=orange, style=filled]\n'
@@ -8,57 +20,392 @@ def _dot_var(v, verbose=False):
     if verbose and v.data is not None:
         if v.name is not None:
             name += ': '
-        name += str(v.shape) + ' ' + str(v.dtype)
+        name += _shape_dtype(v.shape, v.dtype)
     return dot_var.format(id(v), name)
 
+@functools.lru_cache(maxsize=1024)
+def _shape_dtype(shape, dtype):
+    # str(dtype)は遅いので、同じ形状・型のラベルは使い回す
+    return str(shape) + ' ' + str(dtype)
+
 def _dot_func(f):
     dot_func = '{}[label="{}", color=lightblue, style=filled, shape=box]\n'
-    txt = dot_func.format(id(f), f.__class__.__name__)
-    
+    txt = [dot_func.format(id(f), f.__class__.__name__)]
+
     dot_edge = '{} -> {}\n'
     for x in f.inputs:
-        txt += dot_edge.format(id(x), id(f))
+        txt.append(dot_edge.format(id(x), id(f)))
     for y in f.outputs:  # y is weakref
-        txt += dot_edge.format(id(f), id(y()))
-    return txt
+        if y() is not None:
+            txt.append(dot_edge.format(id(f), id(y())))
+    return ''.join(txt)
 
-def get_dot_graph(output, verbose=True):
-    txt = ''
-    funcs = []
-    seen_set = set()
-
-    def add_func(f):
-        if f not in seen_set:
-            funcs.append(f)
-            # funcs.sort(key=lambda x: x.generation)
-            seen_set.add(f)
-        
-    add_func(output.creator)
-    txt += _dot_var(output, verbose)
-    
+def _walk_graph(output, max_depth=None, max_nodes=None):
+    # 出力から幅優先で計算グラフをたどり、('var', v, depth) / ('func', f, depth) /
+    # ('collapsed', 出力変数のリスト, depth) を返す。変数は1回だけ返す。
+    # max_depth（出力からの関数の段数）やmax_nodes（関数の数）を超えた部分は
+    # 1つの「...」ノード（collapsed）にまとめる
+    funcs = collections.deque()
+    seen_funcs = set()
+    seen_vars = set()
+    collapsed = []
+
+    def add_func(f, depth):
+        if f in seen_funcs:
+            return
+        if (max_depth is not None and depth > max_depth) or \
+                (max_nodes is not None and len(seen_funcs) >= max_nodes):
+            collapsed.append(f)
+            return
+        seen_funcs.add(f)
+        funcs.append((f, depth))
+
+    seen_vars.add(id(output))
+    yield 'var', output, 0
+    if output.creator is not None:
+        add_func(output.creator, 1)
+
+    max_seen = 0
     while funcs:
-        func = funcs.pop()
-        txt += _dot_func(func)
+        func, depth = funcs.popleft()
+        max_seen = depth
+        yield 'func', func, depth
         for x in func.inputs:
-            txt += _dot_var(x, verbose)
-            
+            if id(x) not in seen_vars:
+                seen_vars.add(id(x))
+                yield 'var', x, depth
             if x.creator is not None:
-                add_func(x.creator)
-    return 'digraph g {\n' + txt + '}'
+                add_func(x.creator, depth + 1)
 
-def plot_dot_graph(output, verbose=True, to_file='graph.png'):
-    dot_graph = get_dot_graph(output, verbose)
-    
-    # 1. dotデータをフィルに保存
+    if collapsed:
+        ys = {}
+        for f in collapsed:
+            for y in f.outputs:
+                y = y()
+                if y is not None and id(y) in seen_vars:
+                    ys[id(y)] = y
+        yield 'collapsed', list(ys.values()), max_seen + 1
+
+def iter_dot_graph(output, verbose=True, max_depth=None, max_nodes=None):
+    # DOT言語の文字列を少しずつ返す（文字列を連結しないので大きなグラフでも線形時間）
+    yield 'digraph g {\n'
+    for kind, obj, depth in _walk_graph(output, max_depth, max_nodes):
+        if kind == 'var':
+            yield _dot_var(obj, verbose)
+        elif kind == 'func':
+            yield _dot_func(obj)
+        else:
+            yield 'collapsed[label="...", shape=box, style=dashed]\n'
+            for y in obj:
+                yield 'collapsed -> {}\n'.format(id(y))
+    yield '}'
+
+def write_dot_graph(output, file, verbose=True, max_depth=None, max_nodes=None):
+    for chunk in iter_dot_graph(output, verbose, max_depth, max_nodes):
+        file.write(chunk)
+
+def get_dot_graph(output, verbose=True, max_depth=None, max_nodes=None):
+    return ''.join(iter_dot_graph(output, verbose, max_depth, max_nodes))
+
+# =============================================================================
+# Graphvizを使わない出力（JSON / SVG）
+# =============================================================================
+def get_graph_dict(output, verbose=True, max_depth=None, max_nodes=None):
+    # ノードは{'id', 'label', 'kind'（var / func / collapsed）, 'layer'}、エッジは[始点, 終点]
+    nodes = []
+    edges = []
+    ids = set()
+    funcs = []
+    for kind, obj, depth in _walk_graph(output, max_depth, max_nodes):
+        if kind == 'var':
+            name = '' if obj.name is None else obj.name
+            if verbose and obj.data is not None:
+                if obj.name is not None:
+                    name += ': '
+                name += _shape_dtype(obj.shape, obj.dtype)
+            nodes.append({'id': id(obj), 'label': name, 'kind': 'var', 'layer': 2 * depth})
+            ids.add(id(obj))
+        elif kind == 'func':
+            nodes.append({'id': id(obj), 'label': obj.__class__.__name__, 'kind': 'func',
+                          'layer': 2 * depth - 1})
+            funcs.append(obj)
+        else:
+            nodes.append({'id': 'collapsed', 'label': '...', 'kind': 'collapsed',
+                          'layer': 2 * depth - 1})
+            edges += [['collapsed', id(y)] for y in obj]
+
+    for f in funcs:
+        edges += [[id(x), id(f)] for x in f.inputs]
+        edges += [[id(f), id(y())] for y in f.outputs if id(y()) in ids]
+    return {'nodes': nodes, 'edges': edges}
+
+def write_graph_json(graph, path):
+    with open(path, 'w') as f:
+        json.dump(graph, f)
+
+def write_graph_svg(graph, path, dx=160, dy=60):
+    # 層（出力からの距離）ごとに横に並べるだけの簡単なレイアウト。入力が上、出力が下
+    layers = collections.defaultdict(list)
+    for node in graph['nodes']:
+        layers[node['layer']].append(node)
+    n_layers = max(layers) + 1
+    width = max(len(nodes) for nodes in layers.values()) * dx + dx
+    height = n_layers * dy + dy
+
+    pos = {}
+    for layer, nodes in layers.items():
+        for i, node in enumerate(nodes):
+            pos[node['id']] = (dx * (i + 1), dy * (n_layers - layer))
+
+    with open(path, 'w') as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+                'font-family="sans-serif" font-size="11">\n'.format(width, height))
+        for src, dst in graph['edges']:
+            (x1, y1), (x2, y2) = pos[src], pos[dst]
+            f.write('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="gray"/>\n'.format(
+                x1, y1, x2, y2))
+        for node in graph['nodes']:
+            x, y = pos[node['id']]
+            if node['kind'] == 'var':
+                f.write('<ellipse cx="{}" cy="{}" rx="60" ry="15" fill="orange"/>\n'.format(x, y))
+            else:
+                fill = 'lightblue' if node['kind'] == 'func' else 'white'
+                f.write('<rect x="{}" y="{}" width="100" height="26" fill="{}" stroke="gray"/>\n'
+                        .format(x - 50, y - 13, fill))
+            f.write('<text x="{}" y="{}" text-anchor="middle">{}</text>\n'.format(
+                x, y + 4, html.escape(node['label'])))
+        f.write('</svg>\n')
+
+# =============================================================================
+# 画像の作成（dotコマンド）
+# plot_dot_graph(..., block=False)の場合は、バックグラウンドのスレッドで
+# まとめてdotコマンドを呼び、concurrent.futures.Futureを返す
+# =============================================================================
+def _render_batch(jobs):
+    # jobs: [(dotファイル, 出力ファイル, Future)]。形式ごとに1回だけdotを呼ぶ
+    by_ext = collections.defaultdict(list)
+    for job in jobs:
+        by_ext[os.path.splitext(job[1])[1][1:]].append(job)
+
+    for ext, group in by_ext.items():
+        # -Oを指定すると、a.dot -> a.dot.pngのように入力ファイル名から出力ファイル名を決める
+        cmd = ['dot', '-T' + ext, '-O'] + [graph_path for graph_path, to_file, future in group]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        for graph_path, to_file, future in group:
+            out = graph_path + '.' + ext
+            error = None
+            try:
+                if os.path.exists(out):
+                    # 一時ディレクトリと出力先が別のファイルシステムでも移動できるようにshutil.moveを使う
+                    shutil.move(out, to_file)
+                else:
+                    error = RuntimeError(proc.stderr.strip() or 'dot failed')
+            except Exception as e:
+                error = e
+            finally:
+                _remove(graph_path)
+                _remove(out)
+            # 一時ファイルを消してから結果を返す
+            if error is None:
+                future.set_result(to_file)
+            else:
+                future.set_exception(error)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _RenderQueue:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, graph_path, to_file):
+        future = concurrent.futures.Future()
+        self.queue.put((graph_path, to_file, future))
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, daemon=True)
+                self.thread.start()
+                atexit.register(self.queue.join)  # 終了前に残りを描画する
+        return future
+
+    def _worker(self):
+        while True:
+            jobs = [self.queue.get()]
+            while True:  # 溜まっている依頼をまとめて処理する
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                _render_batch(jobs)
+            except Exception as e:
+                for graph_path, to_file, future in jobs:
+                    _remove(graph_path)
+                    if not future.done():
+                        future.set_exception(e)
+            for _ in jobs:
+                self.queue.task_done()
+
+
+_render_queue = _RenderQueue()
+
+
+def plot_dot_graph(output, verbose=True, to_file='graph.png', max_depth=None, max_nodes=None,
+                   block=True):
+    extension = os.path.splitext(to_file)[1][1:]  # 拡張子
+
+    # Graphvizがない場合（またはjsonの場合）はPythonだけで出力する
+    if extension == 'json' or shutil.which('dot') is None:
+        graph = get_graph_dict(output, verbose, max_depth, max_nodes)
+        if extension == 'json':
+            write_graph_json(graph, to_file)
+        else:
+            if extension != 'svg':
+                to_file = os.path.splitext(to_file)[0] + '.svg'
+                warnings.warn('Graphviz (dot) is not installed; writing {}'.format(to_file))
+            write_graph_svg(graph, to_file)
+        future = concurrent.futures.Future()
+        future.set_result(to_file)
+        return None if block else future
+
+    # 1. dotデータを一時ファイルに保存（同時に呼ばれても衝突しないようにファイル名は毎回変える）
     tmp_dir = os.path.join(os.path.expanduser('~'), '.dezero')
-    if not os.path.exists(tmp_dir):
-        os.mkdir(tmp_dir)
-    graph_path = os.path.join(tmp_dir, 'tmp_graph.dot')
-    
-    with open(graph_path, 'w') as f:
-        f.write(dot_graph)
-    
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, graph_path = tempfile.mkstemp(suffix='.dot', dir=tmp_dir)
+    with os.fdopen(fd, 'w') as f:
+        write_dot_graph(output, f, verbose, max_depth, max_nodes)
+
     # 2. dotコマンドを呼ぶ
-    extension = os.path.splitext(to_file)[1][1:]  # 拡張子
-    cmd = 'dot {} -T {} -o {}'.format(graph_path, extension, to_file)
-    subprocess.run(cmd, shell=True)
\ No newline at end of file
+    if not block:
+        return _render_queue.submit(graph_path, to_file)
+    future = concurrent.futures.Future()
+    try:
+        _render_batch([(graph_path, to_file, future)])
+    finally:
+        _remove(graph_path)  # dotの呼び出しに失敗した場合も一時ファイルを残さない
+    future.result()
+
+
+# =============================================================================
+# Utility functions for numpy
+# =============================================================================
+def sum_to(x, shape):
+    # ブロードキャストされた配列xを、和をとってshapeの形に戻す
+    ndim = len(shape)
+    lead = x.ndim - ndim
+    lead_axis = tuple(range(lead))
+
+    axis = tuple([i + lead for i, sx in enumerate(shape) if sx == 1])
+    y = x.sum(lead_axis + axis, keepdims=True)
+    if lead > 0:
+        y = y.squeeze(lead_axis)
+    return y
+
+
+# =============================================================================
+# Gradient check
+# =============================================================================
+def gradient_check(f, x, *args, rtol=1e-4, atol=1e-5, **kwargs):
+    # 逆伝播で求めた勾配と数値微分の結果が一致するか確認する
+    # 呼び出し側の変数（の値や勾配）を書き換えないように、float64の新しい変数で確認する
+    from dezero.core_simple import Variable
+
+    data = x.data if isinstance(x, Variable) else x
+    x = Variable(np.array(data, dtype=np.float64))
+
+    num_grad = numerical_grad(f, x.data, *args, **kwargs)
+    y = f(x, *args, **kwargs)
+    y.backward()
+    bp_grad = x.grad
+
+    assert bp_grad.shape == num_grad.shape
+    res = np.allclose(bp_grad, num_grad, atol=atol, rtol=rtol)
+
+    if not res:
+        print('')
+        print('========== FAILED (Gradient Check) ==========')
+        print('Numerical Grad')
+        print(' shape: {}'.format(num_grad.shape))
+        val = str(num_grad.flatten()[:10])
+        print(' values: {} ...'.format(val[1:-1]))
+        print('Backprop Grad')
+        print(' shape: {}'.format(bp_grad.shape))
+        val = str(bp_grad.flatten()[:10])
+        print(' values: {} ...'.format(val[1:-1]))
+    return res
+
+
+def numerical_grad(f, x, *args, eps=1e-4, max_batch_size=2 ** 22, **kwargs):
+    # 出力の総和をxで微分した値を中心差分で求める。
+    # fが先頭の軸（バッチ）について要素ごとに計算できる場合は、全要素をずらした入力を
+    # 積み重ねて1回（大きい場合は数回）のfの呼び出しで計算する
+    grad = _numerical_grad_batched(f, x, args, kwargs, eps, max_batch_size)
+    if grad is None:
+        grad = _numerical_grad_loop(f, x, args, kwargs, eps)
+    return grad
+
+
+def _call(f, x, args, kwargs):
+    from dezero.core_simple import Variable, no_grad
+
+    with no_grad():
+        y = f(Variable(x), *args, **kwargs)
+    return y.data if isinstance(y, Variable) else np.asarray(y)
+
+
+def _numerical_grad_batched(f, x, args, kwargs, eps, max_batch_size):
+    n = x.size
+    if n == 0:
+        return np.zeros_like(x)
+    y = _call(f, x, args, kwargs)
+    # 1回に積み重ねる行数（ずらした入力の行数）を要素数で制限する
+    rows = max(1, max_batch_size // (max(x.size, y.size) * 2))
+
+    flat = x.reshape(-1)
+    grad = np.zeros(n, dtype=np.float64)
+    for start in range(0, n, rows):
+        idx = np.arange(start, min(start + rows, n))
+        k = len(idx)
+        X = np.tile(flat, (2 * k + 1, 1))
+        X[np.arange(k), idx] += eps
+        X[np.arange(k) + k, idx] -= eps  # 最後の行はずらさない（確認用）
+        X = X.reshape((2 * k + 1,) + x.shape)
+        try:
+            with np.errstate(all='ignore'):
+                Y = _call(f, X, args, kwargs)
+        except Exception:
+            return None
+        # 先頭の軸ごとに独立に計算されていない場合は、1要素ずつの計算に切り替える
+        if Y.shape != (2 * k + 1,) + y.shape or \
+                not np.allclose(Y[-1], y, equal_nan=True):
+            return None
+        Y = Y.reshape(2 * k + 1, -1).sum(axis=1)
+        grad[idx] = (Y[:k] - Y[k:2 * k]) / (2 * eps)
+    return grad.reshape(x.shape)
+
+
+def _numerical_grad_loop(f, x, args, kwargs, eps):
+    x = x.copy()
+    grad = np.zeros_like(x, dtype=np.float64)
+    it = np.nditer(x, flags=['multi_index'], op_flags=['readwrite'])
+    while not it.finished:
+        idx = it.multi_index
+        tmp_val = x[idx].copy()
+
+        x[idx] = tmp_val + eps
+        y1 = _call(f, x, args, kwargs).sum()
+
+        x[idx] = tmp_val - eps
+        y2 = _call(f, x, args, kwargs).sum()
+
+        grad[idx] = (y1 - y2) / (2 * eps)
+        x[idx] = tmp_val
+        it.iternext()
+    return grad
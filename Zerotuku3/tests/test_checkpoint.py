@@ -0,0 +1,42 @@
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+import pytest
+from dezero import Variable
+from dezero.checkpoint import checkpoint
+
+# checkpointした区間の勾配は、checkpointしない場合と一致する
+
+cases = [
+    ('identity', lambda x: x),
+    ('two outputs', lambda x: (x * 3 * 2, x * 3 + 1)),
+    ('pass-through output', lambda x: (x * 3, x)),
+    ('same input twice', lambda x: (x, x)),
+]
+
+
+def total(ys):
+    ys = ys if isinstance(ys, (tuple, list)) else (ys,)
+    y = ys[0] * 5
+    for t in ys[1:]:
+        y = y + t
+    return y
+
+
+@pytest.mark.parametrize('name, fn', cases, ids=[c[0] for c in cases])
+def test_checkpoint_grad(name, fn):
+    x = Variable(np.array(1.0))
+    total(fn(x)).backward()
+    expected = x.grad
+
+    x = Variable(np.array(1.0))
+    total(checkpoint(fn, x)).backward()
+    assert x.grad == expected
+
+
+def test_unused_output():
+    # 使わない出力（勾配がNone）は1で埋めない
+    x = Variable(np.array(1.0))
+    a, b = checkpoint(lambda x: (x * 3, x * 7), x)
+    a.backward()
+    assert x.grad == 3.0
@@ -0,0 +1,70 @@
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+import pytest
+from dezero import Variable
+from dezero.core_simple import sum_to, broadcast_to
+from dezero.utils import gradient_check, _numerical_grad_batched, _numerical_grad_loop
+
+# core_simple.pyの全てのFunctionについて勾配確認を行う。
+# 1つの確認がbudget秒を超えた場合も失敗にする
+
+budget = 0.5
+shape = (10, 20)
+rng = np.random.RandomState(0)
+a = rng.rand(*shape) + 0.5
+b = Variable(rng.rand(*shape) + 0.5)
+s = Variable(np.array(1.5))
+
+checks = [
+    ('Add', lambda x: x + b, a),
+    ('Add (broadcast)', lambda x: x + s, a),
+    ('Add (broadcast, x)', lambda x: b + x, np.array(0.5)),
+    ('Mul', lambda x: x * b, a),
+    ('Mul (broadcast, x)', lambda x: b * x, np.array(0.5)),
+    ('Neg', lambda x: -x, a),
+    ('Sub', lambda x: x - b, a),
+    ('Sub (rsub)', lambda x: 2.0 - x, a),
+    ('Div', lambda x: x / b, a),
+    ('Div (rdiv)', lambda x: b / x, a),
+    ('Pow', lambda x: x ** 3, a),
+    ('Pow (0.5)', lambda x: x ** 0.5, a),
+    ('SumTo', lambda x: sum_to(x, (1, 20)), a),
+    ('BroadcastTo', lambda x: broadcast_to(x, (10, 20)), a[0]),
+    ('goldstein', lambda x: (1 + (x + b + 1)**2 * (19 - 14*x + 3*x**2 - 14*b + 6*x*b + 3*b**2)) *
+                            (30 + (2*x - 3*b)**2 * (18 - 32*x + 12*x**2 + 48*b - 36*x*b + 27*b**2)),
+     a * 0.1),
+]
+
+
+@pytest.mark.parametrize('name, f, x', checks, ids=[c[0] for c in checks])
+def test_gradient_check(name, f, x):
+    start = time.perf_counter()
+    ok = gradient_check(f, x, rtol=1e-3, atol=1e-3)
+    elapsed = time.perf_counter() - start
+    assert ok
+    assert elapsed < budget, '{}: {:.2f}ms'.format(name, elapsed * 1e3)
+
+
+def test_gradient_check_keeps_variable():
+    # 渡した変数の値・型・勾配は変わらない
+    data = np.arange(6, dtype=np.float32).reshape(2, 3) + 1
+    x = Variable(data)
+    x.grad = np.full((2, 3), 7, dtype=np.float32)
+    assert gradient_check(lambda x: x * x, x, rtol=1e-3, atol=1e-3)
+    assert x.data is data and x.data.dtype == np.float32
+    assert np.all(x.grad == 7)
+    # 同じ変数で2回確認しても勾配が足し合わされない
+    assert gradient_check(lambda x: x * x, x, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize('size', [10, 100, 1000])
+def test_numerical_grad_batched(size):
+    # 積み重ねて計算した数値微分は1要素ずつの計算と一致する
+    # （1要素ずつの計算に切り替わった場合はNoneが返るので失敗にする）
+    f = lambda x: x ** 3 + 2 * x
+    x = rng.rand(size)
+    grad = _numerical_grad_batched(f, x, (), {}, 1e-4, 2 ** 22)
+    assert grad is not None
+    assert np.allclose(grad, _numerical_grad_loop(f, x, (), {}, 1e-4))
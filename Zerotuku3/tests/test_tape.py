@@ -0,0 +1,39 @@
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+import pytest
+from dezero import Variable
+from dezero.tape import trace
+from dezero.fusion import fuse
+
+# 入力の値によって結果が変わる関数は、テープを再生せずに通常どおり計算する
+
+
+def branch_on_element(x):
+    if x.data[0] > 0:
+        return x * 2
+    return x * 3
+
+
+def constant_from_input(x):
+    return x * np.exp(x.data)  # Functionを通さずに入力の値から作った定数
+
+
+@pytest.mark.parametrize('wrap', [trace, fuse])
+@pytest.mark.parametrize('fn', [branch_on_element, constant_from_input])
+def test_value_dependent_falls_back(wrap, fn):
+    f = wrap(fn)
+    for data in [np.array([1.0, 0.0]), np.array([-1.0, 0.0]), np.array([2.0, 0.5])]:
+        assert np.allclose(f(data).data, fn(Variable(data)).data)
+
+
+@pytest.mark.parametrize('wrap', [trace, fuse])
+def test_captured_variable_grad(wrap):
+    c = Variable(np.array(3.0))
+    f = wrap(lambda x: x * c + x)
+    for _ in range(3):
+        x = Variable(np.array(2.0))
+        y = f(x)
+        y.backward()
+        assert y.data == 8.0 and x.grad == 4.0
+    assert c.grad == 6.0  # 3回分